@@ -1,5 +1,5 @@
 import streamlit as st
-import streamlit_analytics
+import uuid
 from config import *
 
 st.set_page_config(
@@ -45,15 +45,45 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-streamlit_analytics.start_tracking(load_from_json=ANALYTICS_JSON_PATH)
-
-from modules.search import perform_search
-from modules.reader import load_bible_xml, get_full_chapter_text, split_content_into_paragraphs, find_matching_verses
-from modules.greek import display_greek_results
-from modules.commentary import display_commentary_results
-from modules.summaries import generate_summaries, setup_llm
+from modules.profiling import profile_startup, profile_imports
+from modules import metrics
+profile_imports("torch", "sentence_transformers", "chromadb", "langchain_community.vectorstores")
+
+with profile_startup("import modules"):
+    from modules.search import perform_search, start_warmup
+    from modules.reader import get_chapter_count, get_full_chapter_text, find_result_verses, render_highlighted_chapter
+    from modules.greek import display_greek_results
+    from modules.commentary import display_commentary_results
+    from modules.summaries import stream_summaries
+    from modules.analytics import AnalyticsWriter
+
+@st.cache_resource
+def get_analytics():
+    return AnalyticsWriter(ANALYTICS_DB_PATH)
+
+def track_event(event_type, name=None, value=None):
+    get_analytics().track(event_type, name, value, session=st.session_state.analytics_session)
+
+def track_widget_changes(widgets):
+    # Records a widget event only when a value differs from the previous run's
+    previous = st.session_state.setdefault('analytics_widgets', dict(widgets))
+    for name, value in widgets.items():
+        if previous.get(name) != value:
+            track_event("widget", name, value)
+    st.session_state.analytics_widgets = dict(widgets)
+
+def handle_search_change():
+    st.session_state.update({'search_query': st.session_state['search_input'], 'search_count': 4})
+    if st.session_state.search_query:
+        track_event("query", "Search", st.session_state.search_query)
 
 def main():
+    metrics.start_run()
+    start_warmup()
+    if 'analytics_session' not in st.session_state:
+        st.session_state.analytics_session = uuid.uuid4().hex
+        track_event("pageview")
+    track_event("script_run")
     st.markdown(HEADER_LABEL, unsafe_allow_html=True)
 
     if 'search_count' not in st.session_state:
@@ -73,12 +103,22 @@ def main():
 
         st.markdown(SIDEBAR_LABEL, unsafe_allow_html=True)
 
+    track_widget_changes({
+        "Old Testament": ot_checkbox,
+        "New Testament": nt_checkbox,
+        "Church Fathers": st.session_state.enable_commentary,
+        "Greek NT": st.session_state.show_greek,
+        "Insights": summarize,
+        "Book": st.session_state.current_book,
+        "Chapter": st.session_state.current_chapter,
+    })
+
     search_query = st.text_input(
         "Search",
         value=st.session_state.get('search_query', ''),
         key="search_input",
         placeholder="What did Jesus say about...?",
-        on_change=lambda: st.session_state.update({'search_query': st.session_state['search_input'], 'search_count': 4})
+        on_change=handle_search_change
     )
 
     search_results = None
@@ -128,17 +168,14 @@ def main():
                 display_commentary_results(commentary_results)
 
             elif tab_name == "📊 Insights":
-                with st.spinner("Generating insights..."):
-                    llm = setup_llm()
-                    summaries = generate_summaries(search_query, search_results, commentary_results)
-                    if 'bible' in summaries:
-                        st.success(summaries['bible'])
-                    if 'commentary' in summaries:
-                        st.success(summaries['commentary'])
+                stream_summaries(search_query, search_results, commentary_results)
 
     # show a footer line break to add white space
     st.write("---")
 
+    if METRICS_DEBUG_PANEL:
+        display_metrics_panel()
+
 def update_book_chapter_from_search(metadata):
     st.session_state.current_book = metadata['book']
     st.session_state.current_chapter = int(metadata['chapter'])
@@ -156,44 +193,73 @@ def handle_book_change():
         st.session_state.current_chapter = 1
 
 def select_chapter():
-    bible_xml = load_bible_xml(BIBLE_XML_FILE)
-    max_chapters = max(int(verse.get('c')) for verse in bible_xml.findall(f".//v[@b='{st.session_state.current_book}']"))
+    max_chapters = get_chapter_count(st.session_state.current_book)
     selected_chapter = st.number_input("Chapter", min_value=1, max_value=max_chapters, value=st.session_state.current_chapter, key="chapter_select", on_change=handle_chapter_change)
 
 def handle_chapter_change():
     if st.session_state.chapter_select != st.session_state.current_chapter:
         st.session_state.current_chapter = st.session_state.chapter_select
 
+@metrics.timed("display_chapter_text")
 def display_chapter_text(search_results):
     if 'current_book' in st.session_state and 'current_chapter' in st.session_state:
         book = st.session_state.current_book
         chapter = st.session_state.current_chapter
-        verses = get_full_chapter_text(book, chapter)
 
-        matching_verses = []
+        matching_verses = set()
         if search_results:
-            first_result_content = search_results[0][0].page_content
-            matching_verses = find_matching_verses(verses, first_result_content)
+            verses = get_full_chapter_text(book, chapter)
+            matching_verses = find_result_verses(verses, book, chapter, search_results[0][0])
 
-        highlighted_text = ""
-        for verse_num, verse_text in verses:
-            if verse_num in matching_verses:
-                highlighted_text += f'<span style="background-color: #FFD700; color: #000000;"><sup>{verse_num}</sup> {verse_text}</span> '
-            else:
-                highlighted_text += f'<sup>{verse_num}</sup> {verse_text} '
+        chapter_html = render_highlighted_chapter(book, chapter, matching_verses)
 
         if search_results:
             score = search_results[0][1]
-            highlighted_text = highlighted_text + f"\n\n**Similarity Score:** {round(score, 4)}\n"
-
-        paragraphs = split_content_into_paragraphs(highlighted_text)
-        for paragraph in paragraphs:
-            st.markdown(paragraph, unsafe_allow_html=True)
+            chapter_html = chapter_html + f"\n\n**Similarity Score:** {round(score, 4)}\n"
+            verse_hits = format_verse_hits(search_results[0][0].metadata)
+            if verse_hits:
+                chapter_html = chapter_html + "\n" + VERSE_HITS_RESULT.format(verses=verse_hits) + "\n"
+
+        st.markdown(chapter_html, unsafe_allow_html=True)
+
+def display_metrics_panel():
+    with st.sidebar.expander("Timings (this run)", expanded=False):
+        run_timings = [
+            {"stage": " ".join([name, *map(str, labels.values())]), "ms": round(seconds * 1000, 1)}
+            for name, labels, seconds in metrics.current_run() or []
+        ]
+        if run_timings:
+            st.dataframe(run_timings, hide_index=True, use_container_width=True)
+        else:
+            st.write("No instrumented stages ran.")
+        hit_rates = metrics.cache_hit_rates()
+        if hit_rates:
+            st.caption("Cache hit rates (process lifetime)")
+            st.dataframe(
+                [{"cache": cache, "hit rate": f"{rate:.0%}"} for cache, rate in sorted(hit_rates.items())],
+                hide_index=True, use_container_width=True,
+            )
+        gauges = metrics.snapshot()["gauges"]
+        if gauges:
+            st.caption("Gauges (process lifetime)")
+            st.dataframe(
+                [
+                    {"gauge": " ".join(str(value) for key, value in gauge.items() if key != "value"), "value": gauge["value"]}
+                    for gauge in gauges
+                ],
+                hide_index=True, use_container_width=True,
+            )
 
 def display_results(bible_results):
     for result in bible_results:
         display_search_result(result)
 
+def format_verse_hits(metadata):
+    return ", ".join(
+        f"{metadata['chapter']}:{hit['verse']} ({round(hit['score'], 4)})"
+        for hit in metadata.get('verse_hits', [])
+    )
+
 def display_search_result(result):
     content, metadata, score = result[0].page_content, result[0].metadata, result[1]
     book = BIBLE_BOOK_NAMES.get(metadata['book'], metadata['book'])
@@ -202,10 +268,9 @@ def display_search_result(result):
     with st.expander(f"**{book} {chapter}**", expanded=True):
         st.markdown(content)
         st.write(SCORE_RESULT.format(value=round(score, 4)))
+        verse_hits = format_verse_hits(metadata)
+        if verse_hits:
+            st.write(VERSE_HITS_RESULT.format(verses=verse_hits))
 
 if __name__ == "__main__":
     main()
-
-streamlit_analytics.stop_tracking(
-    save_to_json=ANALYTICS_JSON_PATH, unsafe_password=UNSAFE_PASSWORD
-)
\ No newline at end of file
@@ -1,9 +1,21 @@
+import os
+
 # File paths
-ANALYTICS_JSON_PATH = "./data/analytics.json"
+ANALYTICS_DB_PATH = "./data/analytics.sqlite"
+ANALYTICS_LEGACY_JSON_PATH = "./data/analytics.json"
 DB_DIR = "./data/db"
 COMMENTARY_DB_DIR = "./data/commentary_db"
+NUMPY_DB_DIR = "./data/db_numpy"
+VERSE_EMBEDDINGS_FILE = "./data/verse_embeddings.npy"
+LEXICAL_BIBLE_INDEX_DIR = "./data/lexical/bible"
+LEXICAL_COMMENTARY_INDEX_DIR = "./data/lexical/commentary"
+EMBEDDING_CACHE_DB = "./data/embedding_cache.sqlite"  # set to None to keep the cache in memory only
+SUMMARY_CACHE_DB = "./data/summary_cache.sqlite"  # set to None to keep the cache in memory only
 BIBLE_XML_FILE = "./data/engwebp_vpl.xml"
+BIBLE_STORE_FILE = "./data/engwebp_vpl.bin"
 LEXICON_XML_FILE = "./data/dodson.xml"
+GREEK_TEXTS_DIR = "./data/sblgnt"
+GREEK_INDEX_FILE = "./data/sblgnt_index.pickle"
 
 # URLs
 HELP_URL = "https://www.github.com/dssjon"
@@ -12,9 +24,27 @@ ABOUT_URL = "Made with <3 by www.github.com/dssjon"
 
 # Model names
 EMBEDDING_MODEL_NAME = "hkunlp/instructor-large"
+EMBEDDING_BACKEND = os.getenv("BIBLOS_EMBEDDING_BACKEND", "fp32")  # "fp32" or "int8"
+EMBEDDING_THREADS = int(os.getenv("BIBLOS_EMBEDDING_THREADS", "0"))  # 0 keeps the torch default
+SEARCH_MODE = os.getenv("BIBLOS_SEARCH_MODE", "vector")  # "vector", "hybrid" (vector fused with BM25) or "lexical" (BM25 only, no model)
+BIBLE_VECTOR_BACKEND = os.getenv("BIBLOS_VECTOR_BACKEND", "chroma")  # "chroma" or "numpy" (exact search over NUMPY_DB_DIR)
 API_URL = "https://api.anthropic.com/v1/messages"
 LLM_MODEL_NAME = "claude-3-5-sonnet-20240620"
 MAX_TOKENS = 500
+LLM_MAX_WORKERS = 4
+SUMMARY_CACHE_SIZE = 512
+SUMMARY_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Query embedding cache; the disk tier drops entries older than the TTL and keeps
+# at most EMBEDDING_CACHE_MAX_ROWS of the newest (about 3 KB each)
+EMBEDDING_CACHE_SIZE = 2048
+EMBEDDING_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+EMBEDDING_CACHE_MAX_ROWS = 100000
+
+# Query embedding micro-batching: concurrent queries arriving within the wait
+# window are encoded together, up to the maximum batch size
+EMBEDDING_BATCH_MAX_SIZE = 16
+EMBEDDING_BATCH_MAX_WAIT_MS = 5
 
 # Query Instructions
 DB_QUERY = "Represent the Religious Bible verse text for semantic search:"
@@ -28,6 +58,48 @@ COMMENTARY_SUMMARY_PROMPT = """You are a concise Biblical scholar assisting a se
 Provide a brief summary of the key insights and interpretations of the Church Fathers' thoughts. Keep your response under 200 words, grounded in conservative theology.
 """
 
+# Commentary search
+COMMENTARY_RELEVANCE_THRESHOLD = 0.80
+# Results fetched per author in the single grouped commentary search pass
+COMMENTARY_OVERFETCH = 4
+
+# Verses re-ranked inside each retrieved Bible chunk (needs VERSE_EMBEDDINGS_FILE)
+VERSE_HITS_PER_RESULT = 3
+
+# Hybrid search: reciprocal rank fusion constant, and the number of top BM25 verses
+# grouped into chapter results
+RRF_K = 60
+LEXICAL_VERSE_CANDIDATES = 64
+# Query terms with a lower BM25 idf are skipped, and a commentary passage needs at
+# least this raw BM25 score to be shown (the lexical counterpart of
+# COMMENTARY_RELEVANCE_THRESHOLD)
+LEXICAL_MIN_IDF = 1.5
+LEXICAL_COMMENTARY_MIN_SCORE = 3.0
+
+# Search results kept per server process for identical searches across reruns
+SEARCH_RESULT_CACHE_SIZE = 256
+
+# Concurrent search
+SEARCH_MAX_WORKERS = 4
+SEARCH_TIMEOUT_SECONDS = 30.0
+
+# Headless search service (service.py); when set, the app searches through it
+SEARCH_SERVICE_URL = os.getenv("BIBLOS_SEARCH_SERVICE_URL")
+
+# Analytics: buffered events are flushed every ANALYTICS_FLUSH_SECONDS; raw events
+# older than ANALYTICS_RETENTION_SECONDS are compacted into daily counts. At most
+# ANALYTICS_MAX_BUFFER events wait in memory; more are dropped while writes fail.
+ANALYTICS_FLUSH_SECONDS = 2.0
+ANALYTICS_MAX_BUFFER = 10000
+ANALYTICS_COMPACT_SECONDS = 60 * 60
+ANALYTICS_RETENTION_SECONDS = 60 * 60 * 24 * 7
+
+# Chapters whose reading-pane markup is kept rendered in memory
+CHAPTER_HTML_CACHE_SIZE = 256
+
+# Sidebar panel with the stage timings of the current rerun
+METRICS_DEBUG_PANEL = os.getenv("BIBLOS_METRICS_DEBUG") == "1"
+
 # Church Fathers
 CHURCH_FATHERS = [
     "Augustine of Hippo",
@@ -47,7 +119,6 @@ DEFAULT_QUERIES = [
 ]
 
 # Other constants
-UNSAFE_PASSWORD = "x"
 LLM_ERROR = "No API token found, so LLM support is disabled."
 LLM_NOT_FOUND = "No API token found, so LLM support is disabled."
 
@@ -59,6 +130,7 @@ CHAPTER = "chapter"
 TITLE = "Biblos: Exploration Tool"
 SEARCH_LABEL = "Semantic Search:"
 SCORE_RESULT = """**Similarity Score**: {value}"""
+VERSE_HITS_RESULT = """**Best Matching Verses**: {verses}"""
 SCORE_FUNCTION = "cosine"
 
 HEADER_LABEL = """
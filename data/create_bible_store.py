@@ -0,0 +1,25 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.bible_store import build_bible_store
+
+# Converts a VPL XML file into the compact memory-mapped store read by the app and create_db.py
+
+input_file = "./engwebp_vpl.xml"
+output_file = "./engwebp_vpl.bin"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_file", default=input_file, help=f"path to input VPL file (expected .xml format, default {input_file})")
+parser.add_argument("-o", "--output_file", default=output_file, help=f"path to the output store file (default {output_file})")
+args = parser.parse_args()
+
+then = datetime.now()
+print(f"Building Bible store {args.output_file} from {args.input_file}...")
+books, chapters, verses = build_bible_store(args.input_file, args.output_file)
+print(f" {books} books, {chapters} chapters, {verses} verses written")
+
+elapsed_time_s = (datetime.now() - then).total_seconds()
+print(f"Completed in {elapsed_time_s} seconds")
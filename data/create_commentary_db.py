@@ -1,133 +1,172 @@
+import sys
 import sqlite3
 import argparse
 from datetime import datetime
 from langchain.schema import Document
-from langchain.embeddings import HuggingFaceInstructEmbeddings
+from langchain.embeddings.huggingface import DEFAULT_EMBED_INSTRUCTION
 from langchain.vectorstores import Chroma
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
 
-# Parse the command-line arguments
-parser = argparse.ArgumentParser()
-parser.add_argument("-db", "--db_file", default="./data.sqlite", help="path to SQLite database file")
-parser.add_argument("-m", "--model_name", default="hkunlp/instructor-large", help="name of the HuggingFace model to use")
-parser.add_argument("-o", "--output_dir", default="./commentary_db", help="path to output directory")
-args = parser.parse_args()
-
-# Update variables with user input
-db_file = args.db_file
-model_name = args.model_name
-output_dir = args.output_dir
-
-# db file from https://github.com/HistoricalChristianFaith/Commentaries-Database
-
-# subset of the authors in the DB
-top_authors = [
-    "Augustine of Hippo",
-    "Athanasius of Alexandria",
-    "Basil of Caesarea",
-    "Gregory of Nazianzus",
-    "Gregory of Nyssa",
-    "Cyril of Alexandria",
-    "Irenaeus",
-    "Cyprian",
-    "Origen of Alexandria"
-]
-
-# New Testament book commentaries found in the db file
-new_testament_books = [
-    'matthew', 'mark', 'luke', 'john', 'acts', 'romans', '1corinthians', '2corinthians',
-    'galatians', 'ephesians', 'philippians', 'colossians', '1thessalonians', '2thessalonians',
-    '1timothy', '2timothy', 'titus', 'philemon', 'hebrews', 'james', '1peter',
-    '2peter', '1john', '2john', '3john', 'jude', 'revelation'
-]
-
-# Connect to SQLite database and handle potential errors
-try:
-    connection = sqlite3.connect(db_file)
-    cursor = connection.cursor()
-
-    query = "SELECT id, father_name, file_name, append_to_author_name, ts, book, location_start, location_end, txt, source_url, source_title FROM commentary"
-    query = query + " WHERE father_name IN ('" + "','".join(top_authors) + "')"
-    #query += " AND book IN ('" + "','".join(new_testament_books) + "')"
-    query += " AND append_to_author_name NOT LIKE '%As Quoted By Aquinas%'"
-
-    print("running query", query)
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    
-except sqlite3.Error as error:
-    print("Error while connecting to sqlite", error)
-    sys.exit(1)
-
-# Create documents
-documents = []
-for row in rows:
-    id, father_name, file_name, append_to_author_name, ts, book, location_start, location_end, txt, source_url, source_title = row
-
-    # skipping smaller commentaries
-    if len(txt) < 1000:
-        continue
-    
-    if source_title == None or source_title == "":
-        continue
-
-    doc = Document(page_content=txt)
-    doc.metadata = {
-        "id": id,
-        "father_name": father_name,
-        "book": book,
-        "location_start": location_start,
-        "location_end": location_end,
-        "source_url": source_url,
-        "source_title": source_title,
-        "append_to_author_name=": append_to_author_name,
-    }
-    
-    documents.append(doc)
-
-# Close the database connection
-cursor.close()
-connection.close()
-
-#Split into chunks
-chunk_size = 1500
-chunk_overlap = 100
-text_splitter = RecursiveCharacterTextSplitter(
-    #separator="\n\n",
-    chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap,
-    #length_function = len,
-    #is_separator_regex = True,
-    #seperator_regex = r"\n\n",
-)
-
-split_documents = text_splitter.split_documents(documents)
-print(f' {len(split_documents)} documents created from {len(documents)} entries')
-
-# Load embeddings
-print(f"Loading embeddings from model {model_name}...")
-embedding_function = HuggingFaceInstructEmbeddings(
-    model_name=model_name,
-    query_instruction="Represent the Religious bible commentary text for semantic search:",
-    encode_kwargs={'normalize_embeddings': True},
-    model_kwargs={"device": "mps"}
-)
-
-# Create Chroma database
-print(f"Initializing db and creating embeddings to {output_dir} (please be patient, this will take a while)...")
-db = Chroma.from_documents(
-    split_documents,
-    embedding_function,
-    persist_directory=output_dir,
-    collection_metadata={"hnsw:space": "cosine"},
-)
-
-print("Saving database...")
-db.persist()
-
-then = datetime.now()
-completed_at = datetime.now()
-elapsed_time_s = (completed_at - then).total_seconds()
-
-print(f"Completed in {elapsed_time_s} seconds")
-exit()
+from embedding_pipeline import batched, chunk_id, default_device, default_workers, embed_batches, write_batches
+
+if __name__ == "__main__":
+    # Parse the command-line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-db", "--db_file", default="./data.sqlite", help="path to SQLite database file")
+    parser.add_argument("-m", "--model_name", default="hkunlp/instructor-large", help="name of the HuggingFace model to use")
+    parser.add_argument("-o", "--output_dir", default="./commentary_db", help="path to output directory")
+    parser.add_argument("-b", "--batch_size", type=int, default=64, help="number of chunks embedded and written per batch")
+    parser.add_argument("-d", "--device", default=None, help="torch device to embed on (default: cuda or mps when available, else cpu)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of embedding worker processes (default: cpu count / threads, at most 4 and limited by free memory)")
+    parser.add_argument("-t", "--threads", type=int, default=2, help="torch threads per worker process")
+    parser.add_argument("-f", "--fetch_size", type=int, default=500, help="number of rows read from SQLite per page")
+    parser.add_argument("-a", "--all_authors", action="store_true", help="index every author in the database instead of top_authors")
+    args = parser.parse_args()
+
+    # Update variables with user input
+    db_file = args.db_file
+    model_name = args.model_name
+    output_dir = args.output_dir
+    batch_size = args.batch_size
+    threads = args.threads
+    device = args.device or default_device()
+    # Accelerators do their own batching; a process pool only pays off on CPU
+    workers = args.workers or (default_workers(threads) if device == "cpu" else 1)
+
+    then = datetime.now()
+
+    # db file from https://github.com/HistoricalChristianFaith/Commentaries-Database
+
+    # subset of the authors in the DB
+    top_authors = [
+        "Augustine of Hippo",
+        "Athanasius of Alexandria",
+        "Basil of Caesarea",
+        "Gregory of Nazianzus",
+        "Gregory of Nyssa",
+        "Cyril of Alexandria",
+        "Irenaeus",
+        "Cyprian",
+        "Origen of Alexandria"
+    ]
+
+    # New Testament book commentaries found in the db file
+    new_testament_books = [
+        'matthew', 'mark', 'luke', 'john', 'acts', 'romans', '1corinthians', '2corinthians',
+        'galatians', 'ephesians', 'philippians', 'colossians', '1thessalonians', '2thessalonians',
+        '1timothy', '2timothy', 'titus', 'philemon', 'hebrews', 'james', '1peter',
+        '2peter', '1john', '2john', '3john', 'jude', 'revelation'
+    ]
+
+    #Split into chunks
+    chunk_size = 1500
+    chunk_overlap = 100
+    text_splitter = RecursiveCharacterTextSplitter(
+        #separator="\n\n",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        #length_function = len,
+        #is_separator_regex = True,
+        #seperator_regex = r"\n\n",
+    )
+
+    # Rows are paged from SQLite, turned into documents, split and embedded as a stream,
+    # so peak memory depends on the batch size rather than on how much of the corpus is indexed
+    def fetch_rows(connection):
+        query = "SELECT id, father_name, file_name, append_to_author_name, ts, book, location_start, location_end, txt, source_url, source_title FROM commentary"
+        query += " WHERE append_to_author_name NOT LIKE '%As Quoted By Aquinas%'"
+        params = []
+        if not args.all_authors:
+            query += " AND father_name IN (" + ",".join("?" * len(top_authors)) + ")"
+            params = top_authors
+        #query += " AND book IN ('" + "','".join(new_testament_books) + "')"
+
+        print("running query", query)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            while rows := cursor.fetchmany(args.fetch_size):
+                yield from rows
+        finally:
+            cursor.close()
+
+    def create_documents(rows):
+        for row in rows:
+            id, father_name, file_name, append_to_author_name, ts, book, location_start, location_end, txt, source_url, source_title = row
+
+            # skipping smaller commentaries
+            if len(txt) < 1000:
+                continue
+
+            if source_title == None or source_title == "":
+                continue
+
+            doc = Document(page_content=txt)
+            doc.metadata = {
+                "id": id,
+                "father_name": father_name,
+                "book": book,
+                "location_start": location_start,
+                "location_end": location_end,
+                "source_url": source_url,
+                "source_title": source_title,
+                "append_to_author_name=": append_to_author_name,
+            }
+            yield doc
+
+    def split_documents(documents):
+        for doc in documents:
+            for chunk in text_splitter.split_documents([doc]):
+                yield chunk_id(chunk, model_name, DEFAULT_EMBED_INSTRUCTION), chunk
+
+    def pending_batches(chunks):
+        # Drops chunks already in the store, checked one batch at a time
+        for batch in batched(chunks, batch_size):
+            batch = list(dict(batch).items())
+            existing_ids = set(db._collection.get(ids=[id for id, doc in batch], include=[])["ids"])
+            batch = [(id, doc) for id, doc in batch if id not in existing_ids]
+            if batch:
+                yield batch
+
+    # Open (or create) the Chroma database
+    print(f"Opening db at {output_dir}...")
+    db = Chroma(
+        persist_directory=output_dir,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+
+    # Connect to SQLite database and handle potential errors
+    connection = None
+    try:
+        connection = sqlite3.connect(db_file)
+
+        print(f"Creating embeddings with {model_name} on {device} ({workers} workers x {threads} threads) in {output_dir} (please be patient, this will take a while)...")
+        embedded = embed_batches(
+            pending_batches(split_documents(create_documents(fetch_rows(connection)))),
+            model_name,
+            DEFAULT_EMBED_INSTRUCTION,
+            device=device,
+            workers=workers,
+            threads=threads,
+        )
+        written, embed_time_s = write_batches(db._collection, embedded)
+        if written:
+            print(f" {written} chunks embedded at {written / embed_time_s:.1f} docs/sec")
+
+    except sqlite3.Error as error:
+        print("Error while connecting to sqlite", error)
+        sys.exit(1)
+
+    finally:
+        # Close the database connection
+        if connection:
+            connection.close()
+
+    print("Saving database...")
+    db.persist()
+
+    completed_at = datetime.now()
+    elapsed_time_s = (completed_at - then).total_seconds()
+
+    print(f"Completed in {elapsed_time_s} seconds")
+    exit()
@@ -1,136 +1,176 @@
-import xml.etree.ElementTree as ET
-import collections
+import os
 import sys
 import argparse
 from datetime import datetime
 
-from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain.vectorstores import Chroma
 from langchain.schema import Document
-from langchain.embeddings import HuggingFaceInstructEmbeddings
+from langchain.embeddings.huggingface import DEFAULT_EMBED_INSTRUCTION
+
+from embedding_pipeline import batched, chunk_id, default_device, default_workers, embed_batches, write_batches
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.bible_store import BibleStore, build_bible_store
 
 # Accept the following arguments:
 #  -input_file (-i) : path to input VPL file (default: "./engwebp_vpl.xml")
 #  -model_name (-m) : name of the HuggingFace model to use (default: "hkunlp/instructor-large")
 #  -query_instruction (-q) : query instruction to use (default: "Represent the religious Bible verse text for semantic search:")
 #  -output_dir (-o) : path to base output directory (default: "./db")
-
-input_file = "./engwebp_vpl.xml"
-model_name = "hkunlp/instructor-large"
-query_instruction = "Represent the Religious Bible verse text for semantic search:"
-output_dir = "./output_bible_db"
-
-# Parse the command-line arguments
-
-parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--input_file", default=input_file, help=f"path to input VPL fil (expected .xml format, default {input_file})")
-parser.add_argument("-m", "--model_name", default=model_name, help=f"name of the HuggingFace model to use (default: {model_name})")
-parser.add_argument("-q", "--query_instruction", default=query_instruction, help=f"query instruction to use (default: \"{query_instruction}\")")
-parser.add_argument("-o", "--output_dir", default=output_dir, help="path to base output directory. The output directory will be modified to reflect the input_file and model_name parameters if they are different from their defaults.")
-args = parser.parse_args()
-
-output_dir = args.output_dir
-
-# If any of the arguemnts are not at their default, then modify the output_dir to reflect the arguments
-if args.input_file != input_file:
-    input_file = args.input_file
-    output_dir = output_dir + "_" + input_file.split('/')[-1].split('.')[0]
-if args.model_name != model_name:
-    model_name = args.model_name
-    output_dir = output_dir + "_" + model_name.replace("/", "_")
-if args.query_instruction != query_instruction:
-    query_instruction = args.query_instruction
-    # TODO: Should we include the query instruction in the output_dir?
-
-print(f"input_file: {input_file}")
-print(f"model_name: {model_name}")
-print(f"query_instruction: {query_instruction}")
-print(f"output_dir: {output_dir}")
-
-# Load XML
-tree = ET.parse(input_file)
-root = tree.getroot()
-
-then = datetime.now()
-
-print()
-print("Parsing XML, grouping verses by chapter...")
-# Group verses by chapter
-verses_by_chapter = collections.defaultdict(list)
-for verse in root.findall("v"):
-    book = verse.attrib["b"]
-    chapter = int(verse.attrib["c"])
-    verse_num = int(verse.attrib["v"])
-    text = verse.text
-
-    verses_by_chapter[(book, chapter)].append((verse_num, text))
-
-print(f' {sum(len(verses) for verses in verses_by_chapter.values())} verses found')
-print(f' {len(verses_by_chapter)} chapters found')
-
-print(f'Creating documents for each chapter...')
-# Create document for each chapter
-documents = []
-testament="OT"
-
-for (book, chapter), verses in verses_by_chapter.items():
-    chapter_text = ""
-    for verse_num, text in verses:
-        chapter_text += f"{text}\n"
-
-    if book.lower().startswith("mat"):
-        testament = "NT"
-
-    verse_nums_as_string = ",".join(str(verse_num) for verse_num, text in verses)
-    doc = Document(page_content=chapter_text)
-    doc.metadata = {
-        "book": book,
-        "chapter": chapter,
-        "verse_nums": verse_nums_as_string,
-        "testament": testament,
-    }
-    documents.append(doc)
-
-# TODO: Try out alternative splitters and test results
-# RecursiveCharacterTextSplitter: This splitter divides the text into fragments based on characters, starting with the first character. If the fragments turn out to be too large, it moves on to the next character. It offers flexibility by allowing you to define the division characters and fragment size
-
-# RecursiveTextSplitter: This splitter divides text into fragments based on words or tokens instead of characters. This provides a more semantic view and is ideal for content analysis rather than structure
-
-# Split into chunks
-chunk_size = 1500
-chunk_overlap = 0
-verse_splitter = RecursiveCharacterTextSplitter(
-    ##separator="\n",
-    chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap,
-)
-bible = verse_splitter.split_documents(documents)
-
-print(f' {len(bible)} documents created from {len(documents)} chapters')
-
-# Load embeddings
-print(f"Loading embeddings from model {model_name}...")
-embedding_function = HuggingFaceInstructEmbeddings(
-    model_name=model_name,
-    query_instruction=query_instruction,
-    encode_kwargs = {'normalize_embeddings': True},
-    model_kwargs = {"device": "mps"}
-)
-
-# Create Chroma database
-print(f"Initializing db and creating embeddings to {output_dir} (please be patient, this will take a while)...")
-db = Chroma.from_documents(
-    bible,
-    embedding_function,
-    persist_directory=output_dir,
-    collection_metadata={"hnsw:space": "cosine"},
-)
-
-print("Saving database...")
-db.persist()
-
-completed_at = datetime.now()
-elapsed_time_s = (completed_at - then).total_seconds()
-
-print(f"Completed in {elapsed_time_s} seconds")
-exit()
+#  -store_file (-s) : path to the compact Bible store built from input_file (default: "./engwebp_vpl.bin")
+#  -batch_size (-b) : number of chunks embedded and written per checkpoint (default: 64)
+#  -device (-d) : torch device to embed on (default: cuda or mps when available, else cpu)
+#  -workers (-w) : number of embedding worker processes (default: cpu count / threads, at most 4 and limited by free memory)
+#  -threads (-t) : torch threads per worker process (default: 2)
+#  -chunk_size (-c) : maximum characters per chunk; chunks always hold whole verses (default: 1500)
+
+if __name__ == "__main__":
+    input_file = "./engwebp_vpl.xml"
+    store_file = "./engwebp_vpl.bin"
+    model_name = "hkunlp/instructor-large"
+    query_instruction = "Represent the Religious Bible verse text for semantic search:"
+    output_dir = "./output_bible_db"
+    batch_size = 64
+    threads = 2
+    chunk_size = 1500
+
+    # Parse the command-line arguments
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input_file", default=input_file, help=f"path to input VPL fil (expected .xml format, default {input_file})")
+    parser.add_argument("-m", "--model_name", default=model_name, help=f"name of the HuggingFace model to use (default: {model_name})")
+    parser.add_argument("-q", "--query_instruction", default=query_instruction, help=f"query instruction to use (default: \"{query_instruction}\")")
+    parser.add_argument("-o", "--output_dir", default=output_dir, help="path to base output directory. The output directory will be modified to reflect the input_file and model_name parameters if they are different from their defaults.")
+    parser.add_argument("-s", "--store_file", default=store_file, help=f"path to the compact Bible store, rebuilt from input_file when missing or stale (default {store_file})")
+    parser.add_argument("-b", "--batch_size", type=int, default=batch_size, help=f"number of chunks embedded and written per checkpoint (default {batch_size})")
+    parser.add_argument("-d", "--device", default=None, help="torch device to embed on (default: cuda or mps when available, else cpu)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of embedding worker processes (default: cpu count / threads, at most 4 and limited by free memory)")
+    parser.add_argument("-t", "--threads", type=int, default=threads, help=f"torch threads per worker process (default {threads})")
+    parser.add_argument("-c", "--chunk_size", type=int, default=chunk_size, help=f"maximum characters per chunk; chunks always hold whole verses (default {chunk_size})")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir
+    store_file = args.store_file
+    batch_size = args.batch_size
+    threads = args.threads
+    chunk_size = args.chunk_size
+    device = args.device or default_device()
+    # Accelerators do their own batching; a process pool only pays off on CPU
+    workers = args.workers or (default_workers(threads) if device == "cpu" else 1)
+
+    # If any of the arguemnts are not at their default, then modify the output_dir to reflect the arguments
+    if args.input_file != input_file:
+        input_file = args.input_file
+        output_dir = output_dir + "_" + input_file.split('/')[-1].split('.')[0]
+    if args.model_name != model_name:
+        model_name = args.model_name
+        output_dir = output_dir + "_" + model_name.replace("/", "_")
+    if args.query_instruction != query_instruction:
+        query_instruction = args.query_instruction
+        # TODO: Should we include the query instruction in the output_dir?
+
+    print(f"input_file: {input_file}")
+    print(f"model_name: {model_name}")
+    print(f"query_instruction: {query_instruction}")
+    print(f"output_dir: {output_dir}")
+
+    then = datetime.now()
+
+    # Build the Bible store if it is missing or older than the XML it was built from
+    if not os.path.exists(store_file) or (os.path.exists(input_file) and os.path.getmtime(store_file) < os.path.getmtime(input_file)):
+        print()
+        print(f"Building Bible store {store_file} from {input_file}...")
+        build_bible_store(input_file, store_file)
+
+    print()
+    print("Reading Bible store, grouping verses by chapter...")
+    # Group verses by chapter
+    verses_by_chapter = {}
+    for book, chapter, verses in BibleStore(store_file).chapters():
+        verses_by_chapter[(book, chapter)] = [(int(verse_num), text) for verse_num, text in verses]
+
+    print(f' {sum(len(verses) for verses in verses_by_chapter.values())} verses found')
+    print(f' {len(verses_by_chapter)} chapters found')
+
+    def chunk_chapter(verses, chunk_size):
+        # Packs consecutive whole verses into chunks of at most chunk_size characters
+        # (a longer verse becomes a chunk of its own), so every chunk maps to an exact
+        # verse range and no verse is ever split across chunks
+        chunk = []
+        length = 0
+        for verse_num, text in verses:
+            verse_length = len(text) + 1
+            if chunk and length + verse_length > chunk_size:
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append((verse_num, text))
+            length += verse_length
+        if chunk:
+            yield chunk
+
+    print(f'Creating verse-aligned chunks for each chapter...')
+    bible = []
+    testament="OT"
+
+    for (book, chapter), verses in verses_by_chapter.items():
+        if book.lower().startswith("mat"):
+            testament = "NT"
+
+        for chunk in chunk_chapter(verses, chunk_size):
+            doc = Document(page_content="".join(f"{text}\n" for verse_num, text in chunk))
+            doc.metadata = {
+                "book": book,
+                "chapter": chapter,
+                "verse_nums": ",".join(str(verse_num) for verse_num, text in chunk),
+                "verse_start": chunk[0][0],
+                "verse_end": chunk[-1][0],
+                "testament": testament,
+            }
+            bible.append(doc)
+
+    print(f' {len(bible)} documents created from {len(verses_by_chapter)} chapters')
+
+    # Each chunk's id is a hash of its text, metadata and the model and instruction that
+    # embed it, so unchanged chunks keep their id across runs and are never re-embedded
+    chunks = {}
+    for doc in bible:
+        chunks.setdefault(chunk_id(doc, model_name, DEFAULT_EMBED_INSTRUCTION), doc)
+
+    # Open (or create) the Chroma database and work out what is left to do
+    print(f"Opening db at {output_dir}...")
+    db = Chroma(
+        persist_directory=output_dir,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    existing_ids = set(db._collection.get(include=[])["ids"])
+    pending = [(id, doc) for id, doc in chunks.items() if id not in existing_ids]
+    stale_ids = list(existing_ids - chunks.keys())
+
+    print(f' {len(chunks) - len(pending)} chunks already embedded, {len(pending)} to embed, {len(stale_ids)} stale')
+    for start in range(0, len(stale_ids), batch_size):
+        db._collection.delete(ids=stale_ids[start:start + batch_size])
+
+    # Embed and write in batches; each batch is persisted on write, so an interrupted
+    # run resumes from the last completed batch
+    print(f"Creating embeddings with {model_name} on {device} ({workers} workers x {threads} threads) in {output_dir} (please be patient, this will take a while)...")
+    embedded = embed_batches(
+        batched(pending, batch_size),
+        model_name,
+        DEFAULT_EMBED_INSTRUCTION,
+        device=device,
+        workers=workers,
+        threads=threads,
+    )
+    written, embed_time_s = write_batches(db._collection, embedded, total=len(pending))
+    if written:
+        print(f" {written} chunks embedded at {written / embed_time_s:.1f} docs/sec")
+
+    print("Saving database...")
+    db.persist()
+
+    completed_at = datetime.now()
+    elapsed_time_s = (completed_at - then).total_seconds()
+
+    print(f"Completed in {elapsed_time_s} seconds")
+    exit()
@@ -0,0 +1,62 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+from langchain.vectorstores import Chroma
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.bible_store import BibleStore, build_bible_store
+from modules.lexical import build_bm25_index
+
+# Builds the BM25 indexes used by BIBLOS_SEARCH_MODE=hybrid and =lexical: one over
+# single Bible verses (from the same Bible store as create_db.py) and one over the
+# commentary chunks already in the commentary Chroma store, so lexical and vector
+# commentary results are the same passages.
+# Accept the following arguments:
+#  -input_file (-i) : path to input VPL file, used if the store must be built (default: "./engwebp_vpl.xml")
+#  -store_file (-s) : path to the compact Bible store (default: "./engwebp_vpl.bin")
+#  -commentary_dir (-c) : path to the commentary Chroma store; skipped if missing (default: "./commentary_db")
+#  -output_dir (-o) : path to the output directory (default: "./lexical")
+
+input_file = "./engwebp_vpl.xml"
+store_file = "./engwebp_vpl.bin"
+commentary_dir = "./commentary_db"
+output_dir = "./lexical"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_file", default=input_file, help=f"path to input VPL file, used if the store must be built (default {input_file})")
+parser.add_argument("-s", "--store_file", default=store_file, help=f"path to the compact Bible store (default {store_file})")
+parser.add_argument("-c", "--commentary_dir", default=commentary_dir, help=f"path to the commentary Chroma store; skipped if missing (default {commentary_dir})")
+parser.add_argument("-o", "--output_dir", default=output_dir, help=f"path to the output directory (default {output_dir})")
+args = parser.parse_args()
+
+then = datetime.now()
+
+if not os.path.exists(args.store_file):
+    print(f"Building Bible store {args.store_file} from {args.input_file}...")
+    build_bible_store(args.input_file, args.store_file)
+
+print("Indexing Bible verses...")
+documents = []
+metadatas = []
+testament = "OT"
+for book, chapter, verses in BibleStore(args.store_file).chapters():
+    if book.lower().startswith("mat"):
+        testament = "NT"
+    for verse_num, text in verses:
+        documents.append(text)
+        metadatas.append({"book": book, "chapter": chapter, "verse": int(verse_num), "testament": testament})
+verse_count, term_count = build_bm25_index(documents, metadatas, os.path.join(args.output_dir, "bible"))
+print(f" {verse_count} verses, {term_count} terms")
+
+if os.path.exists(args.commentary_dir):
+    print(f"Indexing commentary chunks from {args.commentary_dir}...")
+    data = Chroma(persist_directory=args.commentary_dir)._collection.get(include=["documents", "metadatas"])
+    chunk_count, term_count = build_bm25_index(data["documents"], data["metadatas"], os.path.join(args.output_dir, "commentary"))
+    print(f" {chunk_count} chunks, {term_count} terms")
+else:
+    print(f"No commentary store at {args.commentary_dir}, skipping the commentary index")
+
+elapsed_time_s = (datetime.now() - then).total_seconds()
+print(f"Completed in {elapsed_time_s} seconds")
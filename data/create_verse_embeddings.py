@@ -0,0 +1,92 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+import numpy as np
+from langchain.schema import Document
+from langchain.embeddings.huggingface import DEFAULT_EMBED_INSTRUCTION
+
+from embedding_pipeline import batched, default_device, default_workers, embed_batches
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.bible_store import BibleStore, build_bible_store
+
+# Embeds every verse of the Bible store into one matrix whose row i is verse index i
+# of the store. The app uses it to re-rank the verses inside retrieved chunks.
+# Accept the following arguments:
+#  -input_file (-i) : path to input VPL file, used if the store must be built (default: "./engwebp_vpl.xml")
+#  -store_file (-s) : path to the compact Bible store (default: "./engwebp_vpl.bin")
+#  -model_name (-m) : name of the HuggingFace model to use; must match the Bible index (default: "hkunlp/instructor-large")
+#  -output_file (-o) : path to the output matrix (default: "./verse_embeddings.npy")
+#  -dtype : storage type for the matrix (default: float32)
+#  -batch_size (-b) : number of verses embedded per batch (default: 64)
+#  -device (-d) : torch device to embed on (default: cuda or mps when available, else cpu)
+#  -workers (-w) : number of embedding worker processes (default: cpu count / threads, at most 4 and limited by free memory)
+#  -threads (-t) : torch threads per worker process (default: 2)
+
+if __name__ == "__main__":
+    input_file = "./engwebp_vpl.xml"
+    store_file = "./engwebp_vpl.bin"
+    model_name = "hkunlp/instructor-large"
+    output_file = "./verse_embeddings.npy"
+    batch_size = 64
+    threads = 2
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input_file", default=input_file, help=f"path to input VPL file, used if the store must be built (default {input_file})")
+    parser.add_argument("-s", "--store_file", default=store_file, help=f"path to the compact Bible store (default {store_file})")
+    parser.add_argument("-m", "--model_name", default=model_name, help=f"name of the HuggingFace model to use; must match the Bible index (default: {model_name})")
+    parser.add_argument("-o", "--output_file", default=output_file, help=f"path to the output matrix (default {output_file})")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"], help="storage type for the matrix (default float32)")
+    parser.add_argument("-b", "--batch_size", type=int, default=batch_size, help=f"number of verses embedded per batch (default {batch_size})")
+    parser.add_argument("-d", "--device", default=None, help="torch device to embed on (default: cuda or mps when available, else cpu)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of embedding worker processes (default: cpu count / threads, at most 4 and limited by free memory)")
+    parser.add_argument("-t", "--threads", type=int, default=threads, help=f"torch threads per worker process (default {threads})")
+    args = parser.parse_args()
+
+    device = args.device or default_device()
+    workers = args.workers or (default_workers(args.threads) if device == "cpu" else 1)
+
+    then = datetime.now()
+
+    if not os.path.exists(args.store_file):
+        print(f"Building Bible store {args.store_file} from {args.input_file}...")
+        build_bible_store(args.input_file, args.store_file)
+
+    bible_store = BibleStore(args.store_file)
+    if bible_store.verse_count == 0:
+        sys.exit(f"Bible store {args.store_file} holds no verses; rebuild it from a valid VPL file")
+    print(f"Embedding {bible_store.verse_count} verses with {args.model_name} on {device} ({workers} workers x {args.threads} threads)...")
+
+    # The same document instruction as create_db.py, so verse and chunk scores are comparable
+    verses = ((index, Document(page_content=bible_store.verse_text(index))) for index in range(bible_store.verse_count))
+    embedded = embed_batches(
+        batched(verses, args.batch_size),
+        args.model_name,
+        DEFAULT_EMBED_INSTRUCTION,
+        device=device,
+        workers=workers,
+        threads=args.threads,
+    )
+
+    # Written to a temporary file and renamed at the end, so the app never opens a partial matrix
+    temp_file = args.output_file + ".tmp.npy"
+    matrix = None
+    written = 0
+    for batch, embeddings in embedded:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(temp_file, mode="w+", dtype=args.dtype, shape=(bible_store.verse_count, vectors.shape[1]))
+        rows = [index for index, doc in batch]
+        matrix[rows[0]:rows[-1] + 1] = vectors
+        written += len(batch)
+        print(f" {written}/{bible_store.verse_count} verses embedded")
+
+    matrix.flush()
+    del matrix
+    os.replace(temp_file, args.output_file)
+
+    elapsed_time_s = (datetime.now() - then).total_seconds()
+    print(f"Completed in {elapsed_time_s} seconds")
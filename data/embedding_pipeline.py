@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Shared embedding pipeline for create_db.py and create_commentary_db.py.
+# Documents arrive as a stream of (id, Document) batches, are embedded across a pool
+# of worker processes (each with its own model copy and pinned torch thread count)
+# and are written to the Chroma collection in bulk as each batch completes.
+
+_worker_model = None
+
+MAX_DEFAULT_WORKERS = 4
+# Model copy plus activations and batch buffers per worker process
+WORKER_MEMORY_BYTES = 2 * 1024 ** 3
+
+
+def default_device():
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def chunk_id(doc, model_name, embed_instruction):
+    # Stable across runs for unchanged chunks, so incremental builds can skip them
+    key = json.dumps([model_name, embed_instruction, doc.page_content, doc.metadata], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_model(model_name, embed_instruction, device, threads):
+    global _worker_model
+    import torch
+    from InstructorEmbedding import INSTRUCTOR
+
+    if threads:
+        torch.set_num_threads(threads)
+    _worker_model = (INSTRUCTOR(model_name, device=device), embed_instruction)
+
+
+def _embed_texts(texts):
+    model, embed_instruction = _worker_model
+    pairs = [[embed_instruction, text] for text in texts]
+    return model.encode(pairs, batch_size=len(pairs), normalize_embeddings=True).tolist()
+
+
+def embed_batches(batches, model_name, embed_instruction, device="cpu", workers=1, threads=0, max_in_flight=None):
+    # Yields (batch, embeddings) in input order, keeping at most max_in_flight batches
+    # submitted at once so memory stays bounded however long the input stream is.
+    # Worker processes are spawned, not forked: the parent has already imported torch
+    # and opened Chroma (with its background threads) by the time the pool starts.
+    # The build scripts keep their work under a __main__ guard so spawning is safe.
+    if workers <= 1:
+        _load_model(model_name, embed_instruction, device, threads)
+        for batch in batches:
+            yield batch, _embed_texts([doc.page_content for id, doc in batch])
+        return
+
+    max_in_flight = max_in_flight or workers * 2
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_load_model,
+        initargs=(model_name, embed_instruction, device, threads),
+    ) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, executor.submit(_embed_texts, [doc.page_content for id, doc in batch])))
+            if len(in_flight) >= max_in_flight:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield batch, future.result()
+
+
+def write_batches(collection, embedded_batches, total=None):
+    # Bulk-adds each embedded batch to the collection and reports throughput
+    start = time.perf_counter()
+    written = 0
+    for batch, embeddings in embedded_batches:
+        collection.add(
+            ids=[id for id, doc in batch],
+            embeddings=embeddings,
+            documents=[doc.page_content for id, doc in batch],
+            metadatas=[doc.metadata for id, doc in batch],
+        )
+        written += len(batch)
+        rate = written / (time.perf_counter() - start)
+        progress = f"{written}/{total}" if total is not None else f"{written}"
+        print(f" {progress} documents embedded ({rate:.1f} docs/sec)")
+    return written, time.perf_counter() - start
+
+
+def available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_workers(threads):
+    # Every worker holds its own model copy (about 1.3 GB for instructor-large), so
+    # the default is capped by free memory and by MAX_DEFAULT_WORKERS as well as by cores
+    workers = min(MAX_DEFAULT_WORKERS, (os.cpu_count() or 1) // max(1, threads))
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, memory // WORKER_MEMORY_BYTES)
+    return max(1, workers)
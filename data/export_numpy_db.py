@@ -0,0 +1,29 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+from langchain.vectorstores import Chroma
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.vector_store import export_chroma_collection
+
+# Exports the embeddings, documents and metadata of a Chroma store into the layout
+# read by the NumPy brute-force backend (BIBLOS_VECTOR_BACKEND=numpy)
+
+input_dir = "./db"
+output_dir = "./db_numpy"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_dir", default=input_dir, help=f"path to the Chroma store to export (default {input_dir})")
+parser.add_argument("-o", "--output_dir", default=output_dir, help=f"path to the output directory (default {output_dir})")
+parser.add_argument("-d", "--dtype", default="float32", choices=["float32", "float16"], help="storage type for the embedding matrix (default float32)")
+args = parser.parse_args()
+
+then = datetime.now()
+print(f"Exporting {args.input_dir} to {args.output_dir} as {args.dtype}...")
+rows, dimensions = export_chroma_collection(Chroma(persist_directory=args.input_dir)._collection, args.output_dir, args.dtype)
+print(f" {rows} embeddings of {dimensions} dimensions written")
+
+elapsed_time_s = (datetime.now() - then).total_seconds()
+print(f"Completed in {elapsed_time_s} seconds")
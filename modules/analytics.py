@@ -0,0 +1,227 @@
+# analytics.py
+
+# Usage analytics: events are buffered in memory and appended to a SQLite file in
+# batches by one background thread, so recording an event costs a queue put
+# regardless of how much history has accumulated. Raw events older than the
+# retention window are periodically compacted into daily counts. Counts saved by
+# streamlit-analytics in the old analytics.json are imported once on first start.
+#   python -m modules.analytics    prints the daily counts
+
+import os
+import json
+import sqlite3
+import threading
+import atexit
+import queue
+import time
+from config import (
+    ANALYTICS_DB_PATH,
+    ANALYTICS_LEGACY_JSON_PATH,
+    ANALYTICS_FLUSH_SECONDS,
+    ANALYTICS_COMPACT_SECONDS,
+    ANALYTICS_RETENTION_SECONDS,
+    ANALYTICS_MAX_BUFFER,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    session TEXT,
+    type TEXT NOT NULL,
+    name TEXT,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    value TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, type, name, value)
+);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    path TEXT PRIMARY KEY,
+    ts REAL NOT NULL
+);
+"""
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30)
+    # WAL lets readers and the writers of several app processes share the file
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def legacy_counts(data):
+    # daily_counts rows from a streamlit-analytics JSON dump. Page views and script
+    # runs are kept per day; widget counts have no day, so they are dated to the
+    # first tracked day.
+    per_day = data.get("per_day", {})
+    days = per_day.get("days", [])
+    rows = []
+    for event_type, counts in (("pageview", per_day.get("pageviews", [])), ("script_run", per_day.get("script_runs", []))):
+        rows.extend((day, event_type, "", "", count) for day, count in zip(days, counts) if count)
+    first_day = days[0] if days else time.strftime("%Y-%m-%d", time.gmtime())
+    for name, counts in data.get("widgets", {}).items():
+        # Buttons store a single count, other widgets a count per value
+        if not isinstance(counts, dict):
+            counts = {"": counts}
+        rows.extend((first_day, "widget", name, str(value), count) for value, count in counts.items() if count)
+    return rows
+
+
+def import_legacy_counts(connection, path):
+    # Adds the counts from a streamlit-analytics JSON file to daily_counts once; the
+    # legacy_imports row is written in the same transaction, so a restart, or a
+    # second app process racing this one, cannot import the file twice
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, encoding="utf-8") as f:
+            rows = legacy_counts(json.load(f))
+        with connection:
+            connection.execute("INSERT INTO legacy_imports (path, ts) VALUES (?, ?)", (os.path.abspath(path), time.time()))
+            connection.executemany(
+                """
+                INSERT INTO daily_counts (day, type, name, value, count) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (day, type, name, value) DO UPDATE SET count = count + excluded.count
+                """,
+                rows,
+            )
+    except sqlite3.IntegrityError:
+        return 0
+    except (OSError, ValueError, AttributeError, sqlite3.Error) as exc:
+        print(f"Could not import legacy analytics from {path}: {exc}")
+        return 0
+    print(f"Imported {len(rows)} legacy analytics counts from {path}")
+    return len(rows)
+
+
+class AnalyticsWriter:
+    def __init__(
+        self,
+        path=ANALYTICS_DB_PATH,
+        flush_interval=ANALYTICS_FLUSH_SECONDS,
+        compact_interval=ANALYTICS_COMPACT_SECONDS,
+        retention=ANALYTICS_RETENTION_SECONDS,
+        max_buffer=ANALYTICS_MAX_BUFFER,
+        legacy_path=ANALYTICS_LEGACY_JSON_PATH,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.retention = retention
+        self.legacy_path = legacy_path
+        # Bounded, so events stop piling up in memory when the database is unwritable
+        self._events = queue.Queue(maxsize=max_buffer)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def track(self, event_type, name=None, value=None, session=None):
+        self._buffer((time.time(), session, event_type, name, None if value is None else str(value)))
+
+    def _buffer(self, event):
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+                first = self._dropped == 1
+            if first:
+                print(f"Analytics buffer is full ({self._events.maxsize} events), dropping new events until writes succeed")
+
+    def _report_dropped(self):
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            print(f"Dropped {dropped} analytics events while the buffer was full")
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._events.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, connection, batch):
+        with connection:
+            connection.executemany(
+                "INSERT INTO events (ts, session, type, name, value) VALUES (?, ?, ?, ?, ?)", batch
+            )
+
+    def compact(self, connection):
+        # Folds raw events older than the retention window into daily_counts and
+        # deletes them, in one transaction so no event is counted twice or lost
+        cutoff = time.time() - self.retention
+        with connection:
+            connection.execute(
+                """
+                INSERT INTO daily_counts (day, type, name, value, count)
+                SELECT date(ts, 'unixepoch'), type, coalesce(name, ''), coalesce(value, ''), count(*)
+                FROM events WHERE ts < ? GROUP BY 1, 2, 3, 4
+                ON CONFLICT (day, type, name, value) DO UPDATE SET count = count + excluded.count
+                """,
+                (cutoff,),
+            )
+            connection.execute("DELETE FROM events WHERE ts < ?", (cutoff,))
+
+    def _run(self):
+        connection = connect(self.path)
+        import_legacy_counts(connection, self.legacy_path)
+        last_compaction = 0.0
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            batch = self._drain()
+            if batch:
+                try:
+                    self._write(connection, batch)
+                except sqlite3.Error as exc:
+                    # Keep the batch for the next flush, as far as the buffer allows
+                    print(f"Could not write analytics events: {exc}")
+                    for event in batch:
+                        self._buffer(event)
+                else:
+                    self._report_dropped()
+            if time.monotonic() - last_compaction >= self.compact_interval:
+                try:
+                    self.compact(connection)
+                    last_compaction = time.monotonic()
+                except sqlite3.Error as exc:
+                    print(f"Could not compact analytics events: {exc}")
+            if stopping:
+                break
+        connection.close()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=10)
+
+
+def daily_counts(path=ANALYTICS_DB_PATH):
+    # Compacted counts plus the raw events not compacted yet, per day, type and name
+    connection = connect(path)
+    try:
+        return connection.execute(
+            """
+            SELECT day, type, name, sum(count) FROM (
+                SELECT day, type, name, count FROM daily_counts
+                UNION ALL
+                SELECT date(ts, 'unixepoch'), type, coalesce(name, ''), 1 FROM events
+            ) GROUP BY day, type, name ORDER BY day, type, name
+            """
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    for day, event_type, name, count in daily_counts():
+        print(f"{day}  {event_type:<12} {name:<20} {count}")
@@ -0,0 +1,148 @@
+# bible_store.py
+
+# Compact, memory-mapped Bible text store built from a VPL XML file.
+#
+# File layout (all integers little-endian uint32):
+#   header    magic, version, book count, chapter count, verse count
+#   books     per book: 4-byte code, first chapter index, chapter count
+#   chapters  per chapter: chapter number, first verse index, verse count
+#   verses    per verse: verse number
+#   offsets   verse count + 1 byte offsets into the text blob
+#   blob      UTF-8 verse text
+
+import os
+import mmap
+import struct
+import xml.etree.ElementTree as ET
+from array import array
+
+MAGIC = b"BIBL"
+VERSION = 1
+HEADER = struct.Struct("<4sIIII")
+BOOK_RECORD = struct.Struct("<4sII")
+CHAPTER_RECORD = struct.Struct("<III")
+
+
+def build_bible_store(input_file, output_file):
+    books = []
+    chapters = []
+    verse_nums = array("I")
+    offsets = array("I", [0])
+    blob = bytearray()
+
+    for verse in ET.parse(input_file).getroot().iter("v"):
+        book = verse.get("b")
+        chapter = int(verse.get("c"))
+        if not books or books[-1][0] != book:
+            books.append([book, len(chapters), 0])
+        if books[-1][2] == 0 or chapters[-1][0] != chapter:
+            chapters.append([chapter, len(verse_nums), 0])
+            books[-1][2] += 1
+        chapters[-1][2] += 1
+        verse_nums.append(int(verse.get("v")))
+        blob += (verse.text or "").encode("utf-8")
+        offsets.append(len(blob))
+
+    # Written to a temporary file and renamed into place, so a reader (or another
+    # process building the same store) never maps a partially written file
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    with open(temp_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(books), len(chapters), len(verse_nums)))
+        for code, first_chapter, chapter_count in books:
+            f.write(BOOK_RECORD.pack(code.encode("ascii"), first_chapter, chapter_count))
+        for chapter, first_verse, verse_count in chapters:
+            f.write(CHAPTER_RECORD.pack(chapter, first_verse, verse_count))
+        f.write(verse_nums.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(temp_file, output_file)
+
+    return len(books), len(chapters), len(verse_nums)
+
+
+class BibleStore:
+    def __init__(self, store_file):
+        with open(store_file, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+
+        magic, version, book_count, chapter_count, verse_count = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{store_file} is not a version {VERSION} Bible store")
+
+        position = HEADER.size
+        self._books = {}
+        for _ in range(book_count):
+            code, first_chapter, count = BOOK_RECORD.unpack_from(buffer, position)
+            self._books[code.rstrip(b"\0").decode("ascii")] = (first_chapter, count)
+            position += BOOK_RECORD.size
+
+        self._chapters = buffer[position:position + chapter_count * CHAPTER_RECORD.size].cast("I")
+        position += chapter_count * CHAPTER_RECORD.size
+        self._verse_nums = buffer[position:position + verse_count * 4].cast("I")
+        position += verse_count * 4
+        self._offsets = buffer[position:position + (verse_count + 1) * 4].cast("I")
+        position += (verse_count + 1) * 4
+        self._blob = buffer[position:]
+        self.verse_count = verse_count
+
+    @property
+    def books(self):
+        return list(self._books)
+
+    def chapter_count(self, book):
+        first_chapter, count = self._books.get(book, (0, 0))
+        if not count:
+            return 0
+        return self._chapters[(first_chapter + count - 1) * 3]
+
+    def _chapter_record(self, book, chapter):
+        first_chapter, count = self._books.get(book, (0, 0))
+        # Chapters are stored in order, so the numbering is almost always dense.
+        index = first_chapter + chapter - 1
+        if first_chapter <= index < first_chapter + count and self._chapters[index * 3] == chapter:
+            return self._chapters[index * 3 + 1], self._chapters[index * 3 + 2]
+        for index in range(first_chapter, first_chapter + count):
+            if self._chapters[index * 3] == chapter:
+                return self._chapters[index * 3 + 1], self._chapters[index * 3 + 2]
+        return None
+
+    def verse_offset(self, book, chapter):
+        record = self._chapter_record(book, int(chapter))
+        return record[0] if record else None
+
+    def verse_indices(self, book, chapter):
+        # Store-wide indices of the chapter's verses (rows of the verse embedding matrix)
+        record = self._chapter_record(book, int(chapter))
+        if not record:
+            return range(0)
+        first_verse, count = record
+        return range(first_verse, first_verse + count)
+
+    def verse_text(self, index):
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def verse_num(self, index):
+        return self._verse_nums[index]
+
+    def chapter(self, book, chapter):
+        record = self._chapter_record(book, int(chapter))
+        if not record:
+            return []
+        first_verse, count = record
+        return [
+            (str(self._verse_nums[i]), self.verse_text(i))
+            for i in range(first_verse, first_verse + count)
+        ]
+
+    def chapters(self):
+        for book, (first_chapter, count) in self._books.items():
+            for index in range(first_chapter, first_chapter + count):
+                chapter = self._chapters[index * 3]
+                yield book, chapter, self.chapter(book, chapter)
+
+
+def load_bible_store(store_file, input_file):
+    if not os.path.exists(store_file):
+        build_bible_store(input_file, store_file)
+    return BibleStore(store_file)
@@ -0,0 +1,127 @@
+# cache.py
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DiskCache:
+    # SQLite-backed key/value store; entries older than ttl seconds are treated as
+    # missing, and purge_expired also trims the store to its max_rows newest entries
+    def __init__(self, path, ttl=None, max_rows=None):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, created REAL)"
+        )
+        self._connection.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+            return None
+        return row[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._connection.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            if self.ttl:
+                self._connection.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_rows:
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY created DESC LIMIT ?)",
+                    (self.max_rows,),
+                )
+            self._connection.commit()
+
+
+class TieredCache:
+    # In-memory LRU in front of an optional DiskCache, with hit/miss counters.
+    # encode/decode convert values to and from the bytes or text stored on disk.
+    def __init__(self, max_size, disk_cache=None, encode=None, decode=None):
+        self.memory = LRUCache(max_size)
+        self.disk = disk_cache
+        self._encode = encode or (lambda value: value)
+        self._decode = decode or (lambda value: value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+        if self.disk is not None:
+            stored = self.disk.get(key)
+            if stored is not None:
+                value = self._decode(stored)
+                self.memory.put(key, value)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, self._encode(value))
+            except sqlite3.Error as exc:
+                print(f"Could not persist cache entry: {exc}")
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self.memory),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
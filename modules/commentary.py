@@ -1,7 +1,7 @@
 # commentary.py
 
 import streamlit as st
-from config import FATHER_NAME, SOURCE_TITLE, BOOK, APPEND_TO_AUTHOR_NAME, SCORE_RESULT
+from config import FATHER_NAME, SOURCE_TITLE, BOOK, APPEND_TO_AUTHOR_NAME, SCORE_RESULT, SEARCH_MODE
 
 def display_commentary_results(results):
     if not results:
@@ -9,7 +9,11 @@ def display_commentary_results(results):
         return
 
     results = sorted(results, key=lambda x: x[1], reverse=True)
-    results = [r for r in results if r[1] >= 0.81 and len(r[0].page_content) >= 450]
+    # The score cut-off is a cosine similarity, so it only applies to vector results;
+    # lexical scores are relative to the best passage and already floored by
+    # LEXICAL_COMMENTARY_MIN_SCORE
+    min_score = 0.81 if SEARCH_MODE != "lexical" else 0.0
+    results = [r for r in results if r[1] >= min_score and len(r[0].page_content) >= 450]
     
     if not results:
         st.write("No commentary met the relevance threshold for this query.")
@@ -0,0 +1,70 @@
+# embedding_scheduler.py
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    # Collects query embedding requests from concurrent callers and runs them as
+    # one batched encode. A batch closes when it reaches max_batch_size or when
+    # max_wait_ms has passed since its first request arrived.
+    def __init__(self, encode, max_batch_size=16, max_wait_ms=5):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Counter()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, instruction, text):
+        future = Future()
+        self._queue.put((instruction, text, future))
+        return future
+
+    def embed(self, instruction, text):
+        return self.submit(instruction, text).result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                vectors = self._encode([[instruction, text] for instruction, text, _ in batch])
+                for (_, _, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as exc:
+                for _, _, future in batch:
+                    future.set_exception(exc)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
@@ -0,0 +1,84 @@
+# embeddings.py
+
+import hashlib
+from array import array
+from langchain_core.embeddings import Embeddings
+from modules.cache import DiskCache, TieredCache
+from modules import metrics
+
+
+def load_instructor_model(model_name, backend="fp32", threads=0):
+    # backend "fp32" keeps the model as published; "int8" applies dynamic int8
+    # quantization to its Linear layers for faster CPU inference
+    import torch
+    from langchain_community.embeddings import HuggingFaceInstructEmbeddings
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = HuggingFaceInstructEmbeddings(model_name=model_name)
+    if backend == "int8":
+        torch.quantization.quantize_dynamic(model.client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif backend != "fp32":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return model
+
+
+def normalize_query(text):
+    return " ".join(text.split())
+
+
+def create_embedding_cache(max_size, disk_path=None, ttl=None, max_rows=None):
+    disk_cache = None
+    if disk_path:
+        disk_cache = DiskCache(disk_path, ttl=ttl, max_rows=max_rows)
+        disk_cache.purge_expired()
+    return TieredCache(
+        max_size,
+        disk_cache,
+        encode=lambda vector: array("f", vector).tobytes(),
+        decode=lambda blob: array("f", blob).tolist(),
+    )
+
+
+class BatchedInstructEmbeddings(Embeddings):
+    # Query embeddings for one instruction, encoded through a shared EmbeddingBatcher
+    # so concurrent queries for any instruction run in the same forward pass.
+    # backend names the weights' precision ("fp32" or "int8"), which changes the vectors.
+    def __init__(self, model, query_instruction, batcher, backend="fp32"):
+        self.model = model
+        self.model_name = model.model_name
+        self.backend = backend
+        self.query_instruction = query_instruction
+        self.batcher = batcher
+
+    def embed_query(self, text):
+        return self.batcher.embed(self.query_instruction, text)
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+
+class CachedEmbeddings(Embeddings):
+    # Wraps an instructor embedding model so query vectors are shared through a
+    # cache keyed by (model, backend, instruction, normalized query). The backend is
+    # part of the key because the disk tier outlives a switch between fp32 and int8.
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def cache_key(self, text):
+        key = "\0".join([self.embeddings.model_name, self.embeddings.backend, self.embeddings.query_instruction, text])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def embed_query(self, text):
+        text = normalize_query(text)
+        key = self.cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with metrics.timed("embed_query"):
+                vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
@@ -3,21 +3,87 @@
 import streamlit as st
 import os
 import re
-from config import NT_BOOK_MAPPING, BIBLE_BOOK_NAMES, LEXICON_XML_FILE
+import pickle
+import unicodedata
+from modules.profiling import profile_startup
+from modules import metrics
+from config import NT_BOOK_MAPPING, BIBLE_BOOK_NAMES, LEXICON_XML_FILE, GREEK_TEXTS_DIR, GREEK_INDEX_FILE
 import xml.etree.ElementTree as ET
 
-@st.cache_resource
-def load_greek_texts(directory):
+def parse_greek_texts(directory):
+    # book -> chapter -> {verse: text}, from lines like "John 1:1\tἘν ἀρχῇ ἦν ὁ λόγος..."
     greek_texts = {}
     for filename in os.listdir(directory):
         if filename.endswith(".txt"):
             book_code = filename.split('.')[0]
+            chapters = greek_texts.setdefault(book_code, {})
             with open(os.path.join(directory, filename), 'r', encoding='utf-8') as file:
-                greek_texts[book_code] = file.readlines()
+                for line in file:
+                    if '\t' not in line:
+                        continue
+                    reference, text = line.split('\t', 1)
+                    chapter, verse = reference.rsplit(' ', 1)[1].split(':')
+                    chapters.setdefault(int(chapter), {})[int(verse)] = text.strip()
     return greek_texts
 
-@st.cache_resource
+@metrics.instrument_cache(st.cache_resource)
+def load_greek_texts(directory, index_file=GREEK_INDEX_FILE):
+    sources = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".txt")]
+    if index_file and os.path.exists(index_file):
+        if os.path.getmtime(index_file) >= max(os.path.getmtime(f) for f in sources):
+            with open(index_file, 'rb') as file:
+                with profile_startup("load greek texts (index)"):
+                    return pickle.load(file)
+
+    with profile_startup("load greek texts (parse)"):
+        greek_texts = parse_greek_texts(directory)
+    if index_file:
+        try:
+            with open(index_file, 'wb') as file:
+                pickle.dump(greek_texts, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as exc:
+            print(f"Could not write Greek text index {index_file}: {exc}")
+    return greek_texts
+
+def accented_greek(word):
+    return unicodedata.normalize('NFC', word).lower()
+
+def normalize_greek(word):
+    decomposed = unicodedata.normalize('NFD', word)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.lower().replace('ς', 'σ')
+
+def build_lexicon_index(lexicon):
+    # Two tiers of lookups, accented (lowercased) and accent-stripped. Each maps a
+    # headword to its first entry, and every prefix of a headword to the entry with
+    # the shortest headword having it (the first in lexicon order on a tie), so an
+    # inflected form resolves to its nearest lemma rather than to whatever entry
+    # happens to come first in the file.
+    index = {}
+    for name, normalize in (('accented', accented_greek), ('stripped', normalize_greek)):
+        headwords = {}
+        shortest = {}
+        for entry_id, entry_data in lexicon.items():
+            if not entry_data['orth']:
+                continue
+            headword = normalize(entry_data['orth'].split(',')[0].strip())
+            headwords.setdefault(headword, entry_id)
+            for end in range(1, len(headword) + 1):
+                prefix = headword[:end]
+                if prefix not in shortest or len(headword) < shortest[prefix][0]:
+                    shortest[prefix] = (len(headword), entry_id)
+        index[name] = {
+            'headwords': headwords,
+            'prefixes': {prefix: entry_id for prefix, (length, entry_id) in shortest.items()},
+        }
+    return index
+
+@metrics.instrument_cache(st.cache_resource)
 def load_lexicon_xml(input_file):
+    with profile_startup("load lexicon"):
+        return parse_lexicon_xml(input_file)
+
+def parse_lexicon_xml(input_file):
     lexicon = {}
     tree = ET.parse(input_file)
     root = tree.getroot()
@@ -34,34 +100,58 @@ def load_lexicon_xml(input_file):
             'orth': orth_text,
             'definitions': defs
         }
-    return lexicon
+    return {'entries': lexicon, 'index': build_lexicon_index(lexicon)}
+
+# Loaded on first use rather than at import, since the Greek NT view is off by default
+def get_greek_texts():
+    return load_greek_texts(GREEK_TEXTS_DIR)
 
-greek_texts = load_greek_texts('./data/sblgnt')
-dodson_lexicon = load_lexicon_xml(LEXICON_XML_FILE)
+def get_lexicon():
+    return load_lexicon_xml(LEXICON_XML_FILE)
 
-@st.cache_data
 def search_greek_texts(book_code, chapter=None):
-    paragraph = ""
-    target_text = greek_texts.get(book_code, [])
-    for line in target_text:
-        if chapter:
-            if line.startswith(f"{book_code} {chapter}:"):
-                text_part = line.split('\t', 1)[1] if '\t' in line else ""
-                paragraph += text_part + " "
-    return paragraph.strip()
+    if not chapter:
+        return ""
+    verses = get_greek_texts().get(book_code, {}).get(int(chapter), {})
+    return " ".join(verses.values())
+
+def search_greek_verse(book_code, chapter, verse):
+    return get_greek_texts().get(book_code, {}).get(int(chapter), {}).get(int(verse))
 
 def extract_greek_word_from_result(result):
     greek_word_regex = r'[\u0370-\u03FF\u1F00-\u1FFF]+' 
     matches = re.findall(greek_word_regex, result)
     return matches if matches else []
 
-@st.cache_data
+def lookup_lexicon(lexicon, greek_word):
+    # An exact headword beats a prefix match, and the accents are only ignored if
+    # the accented form matches nothing
+    index = lexicon['index']
+    accented, stripped = accented_greek(greek_word), normalize_greek(greek_word)
+    entry_id = (
+        index['accented']['headwords'].get(accented)
+        or index['stripped']['headwords'].get(stripped)
+        or index['accented']['prefixes'].get(accented)
+        or index['stripped']['prefixes'].get(stripped)
+    )
+    if entry_id is None:
+        return None
+    return lexicon['entries'][entry_id]['definitions'].get('full', None)
+
 def search_lexicon(greek_word):
-    for entry_id, entry_data in dodson_lexicon.items():
-        if entry_data['orth'].startswith(greek_word):
-            return entry_data['definitions'].get('full', None)
-    return None
+    return lookup_lexicon(get_lexicon(), greek_word)
+
+def search_lexicon_batch(greek_words):
+    # The lexicon is fetched once for the whole batch
+    lexicon = get_lexicon()
+    definitions = {}
+    for greek_word in dict.fromkeys(greek_words):
+        definition = lookup_lexicon(lexicon, greek_word)
+        if definition:
+            definitions[greek_word] = definition
+    return definitions
 
+@metrics.timed("display_greek_results")
 def display_greek_results(results):
     if not results:
         st.write("No search results to display Greek text for.")
@@ -81,14 +171,10 @@ def display_greek_results(results):
                     
                     st.subheader("Dodson Greek Lexicon")
                     greek_words = extract_greek_word_from_result(greek_paragraph)
-                    lexicon_results = set()
-                    for greek_word in greek_words:
-                        definition = search_lexicon(greek_word)
-                        if definition:
-                            lexicon_results.add(f"**{greek_word}**: {definition}")
+                    lexicon_results = search_lexicon_batch(greek_words)
                     if lexicon_results:
-                        for definition in lexicon_results:
-                            st.write(definition)
+                        for greek_word, definition in lexicon_results.items():
+                            st.write(f"**{greek_word}**: {definition}")
                     else:
                         st.write("No definitions found for the Greek words in this passage.")
                 else:
@@ -0,0 +1,134 @@
+# lexical.py
+
+# BM25 keyword search over an inverted index held in a few flat NumPy arrays. It
+# finds rare names and exact wording that embeddings rank poorly, and answers
+# without loading the embedding model.
+#
+# Directory layout (written by build_bm25_index):
+#   postings.npz    terms (sorted), offsets into the postings per term, posting
+#                   document ids and term frequencies, and document lengths
+#   documents.json  text per document
+#   metadata.json   columnar metadata: {field: [value per document]}
+
+import os
+import re
+import json
+from collections import Counter
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def build_bm25_index(documents, metadatas, output_dir):
+    postings = {}
+    doc_lengths = []
+    for doc_id, text in enumerate(documents):
+        counts = Counter(tokenize(text))
+        doc_lengths.append(sum(counts.values()))
+        for term, frequency in counts.items():
+            postings.setdefault(term, []).append((doc_id, frequency))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+    doc_ids = np.fromiter((doc_id for term in terms for doc_id, _ in postings[term]), dtype=np.int32, count=offsets[-1])
+    frequencies = np.fromiter((frequency for term in terms for _, frequency in postings[term]), dtype=np.float32, count=offsets[-1])
+
+    fields = sorted({key for metadata in metadatas for key in metadata})
+    columns = {field: [metadata.get(field) for metadata in metadatas] for field in fields}
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.savez(
+        os.path.join(output_dir, "postings.npz"),
+        terms=np.array(terms, dtype=str),
+        offsets=offsets,
+        doc_ids=doc_ids,
+        frequencies=frequencies.astype(np.uint16),
+        doc_lengths=np.array(doc_lengths, dtype=np.int32),
+    )
+    with open(os.path.join(output_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump(list(documents), f, ensure_ascii=False)
+    with open(os.path.join(output_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f, ensure_ascii=False)
+    return len(documents), len(terms)
+
+
+class BM25Index:
+    def __init__(self, directory, k1=1.2, b=0.75):
+        with np.load(os.path.join(directory, "postings.npz")) as data:
+            self.vocabulary = {term: term_id for term_id, term in enumerate(data["terms"].tolist())}
+            self.offsets = data["offsets"]
+            self.doc_ids = data["doc_ids"]
+            self.frequencies = data["frequencies"].astype(np.float32)
+            doc_lengths = data["doc_lengths"].astype(np.float32)
+        with open(os.path.join(directory, "documents.json"), encoding="utf-8") as f:
+            self.documents = json.load(f)
+        with open(os.path.join(directory, "metadata.json"), encoding="utf-8") as f:
+            self.columns = json.load(f)
+        self._filter_columns = {}
+        self._masks = {}
+
+        # Everything that does not depend on the query is computed once here
+        self.doc_count = len(doc_lengths)
+        self.k1 = k1
+        document_frequencies = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((self.doc_count - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        self.length_norms = k1 * (1 - b + b * doc_lengths / max(float(doc_lengths.mean()), 1.0))
+
+    def column(self, field):
+        if field not in self._filter_columns:
+            self._filter_columns[field] = np.asarray(self.columns.get(field, [None] * self.doc_count), dtype=object)
+        return self._filter_columns[field]
+
+    def mask(self, filter):
+        # Boolean row mask for an equality filter, cached since filters repeat
+        key = tuple(sorted((filter or {}).items()))
+        if not key:
+            return None
+        if key not in self._masks:
+            mask = np.ones(self.doc_count, dtype=bool)
+            for field, value in key:
+                mask &= self.column(field) == value
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def metadata(self, doc_id):
+        return {field: values[doc_id] for field, values in self.columns.items() if values[doc_id] is not None}
+
+    def score(self, query, filter=None, min_idf=0.0):
+        # BM25 score of every document; documents without a query term score 0.
+        # Terms with an idf below min_idf (words like "the" that appear in a large
+        # share of documents) are ignored, which acts as a corpus-derived stopword list.
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in dict.fromkeys(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None or self.idf[term_id] < min_idf:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_ids = self.doc_ids[start:end]
+            frequencies = self.frequencies[start:end]
+            # A term lists each document once, so the fancy-indexed add is exact
+            scores[doc_ids] += self.idf[term_id] * frequencies * (self.k1 + 1) / (frequencies + self.length_norms[doc_ids])
+        mask = self.mask(filter)
+        if mask is not None:
+            scores[~mask] = 0
+        return scores
+
+    def ranked(self, query, filter=None, min_idf=0.0):
+        # (doc id, score) for every matching document, best first
+        scores = self.score(query, filter, min_idf)
+        matches = np.flatnonzero(scores)
+        order = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in order]
+
+    def search(self, query, k=4, filter=None, min_idf=0.0):
+        if k <= 0:
+            return []
+        scores = self.score(query, filter, min_idf)
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        top = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in top]
@@ -0,0 +1,73 @@
+# llm_client.py
+
+import json
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class LLMError(Exception):
+    pass
+
+
+def iter_sse_events(lines):
+    # Yields (event, data) pairs from server-sent event lines
+    event, data = None, []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = None, []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+    if data:
+        yield event, "\n".join(data)
+
+
+class LLMClient:
+    # Messages API client that reuses pooled connections and streams text deltas
+    def __init__(self, api_url, headers, model, max_tokens=256, timeout=60, pool_size=8):
+        self.api_url = api_url
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _request(self, prompt, stream):
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": 0.0,
+            "stream": stream,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    def stream(self, prompt):
+        # Raises LLMError if the connection ends before message_stop, so a cut-off
+        # response is never mistaken for a complete one
+        with self.session.post(self.api_url, json=self._request(prompt, True), stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for event, data in iter_sse_events(response.iter_lines()):
+                payload = json.loads(data)
+                event = event or payload.get("type")
+                if event == "content_block_delta":
+                    text = payload["delta"].get("text")
+                    if text:
+                        yield text
+                elif event == "error":
+                    raise LLMError(payload.get("error", {}).get("message", data))
+                elif event == "message_stop":
+                    return
+        raise LLMError("Response stream ended before message_stop")
+
+    def complete(self, prompt):
+        response = self.session.post(self.api_url, json=self._request(prompt, False), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["content"][0]["text"]
@@ -0,0 +1,147 @@
+# metrics.py
+
+# Lightweight per-stage instrumentation: timers and counters kept in process memory,
+# exported as Prometheus text (service.py /metrics) and optionally logged as one JSON
+# line per timed call (set BIBLOS_METRICS_LOG=1). Each Streamlit rerun can also collect
+# its own timings for the debug panel (see start_run / bind_run).
+
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+METRICS_LOG_JSON = os.getenv("BIBLOS_METRICS_LOG") == "1"
+
+_lock = threading.Lock()
+_timers = {}    # (name, labels) -> [count, total seconds, max seconds]
+_counters = {}  # (name, labels) -> value
+_gauges = {}    # (name, labels) -> value
+_local = threading.local()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def increment(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        timer = _timers.setdefault(key, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+    run = current_run()
+    if run is not None:
+        run.append((name, labels, seconds))
+    if METRICS_LOG_JSON:
+        print(json.dumps({"metric": name, "ms": round(seconds * 1000, 2), "ts": time.time(), **labels}))
+
+@contextmanager
+def timed(name, **labels):
+    # Usable as a context manager or as a function decorator
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def instrument_cache(cache_decorator, name=None):
+    # Wraps a st.cache_data / st.cache_resource decorator so every call and every
+    # miss (the underlying function actually running) is counted per cache
+    def decorator(func):
+        cache_name = name or func.__name__
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            increment("cache_misses", cache=cache_name)
+            return func(*args, **kwargs)
+
+        cached = cache_decorator(compute)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            increment("cache_calls", cache=cache_name)
+            return cached(*args, **kwargs)
+
+        call.clear = cached.clear
+        return call
+    return decorator
+
+def cache_hit_rates():
+    with _lock:
+        calls = {dict(labels)["cache"]: value for (name, labels), value in _counters.items() if name == "cache_calls"}
+        misses = {dict(labels)["cache"]: value for (name, labels), value in _counters.items() if name == "cache_misses"}
+    return {cache: (count - misses.get(cache, 0)) / count for cache, count in calls.items() if count}
+
+def start_run():
+    # Collect the timings of the current thread (and of tasks bound with bind_run)
+    # until the next start_run, for the per-rerun debug panel
+    _local.run = []
+    return _local.run
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def bind_run(func):
+    # Carries the caller's run into executor threads so their timings are collected too
+    run = current_run()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _local.run = run
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.run = None
+    return wrapper
+
+def snapshot():
+    with _lock:
+        timers = {key: list(value) for key, value in _timers.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    return {
+        "timers": [
+            {"name": name, **dict(labels), "count": count, "total_ms": total * 1000, "max_ms": maximum * 1000}
+            for (name, labels), (count, total, maximum) in sorted(timers.items())
+        ],
+        "counters": [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(counters.items())],
+        "gauges": [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(gauges.items())],
+        "cache_hit_rates": cache_hit_rates(),
+    }
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"' for key, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+def prometheus_text(prefix="biblos"):
+    with _lock:
+        timers = {key: list(value) for key, value in _timers.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines = []
+    for (name, labels), (count, total, maximum) in sorted(timers.items()):
+        metric = f"{prefix}_{name}_seconds"
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{metric}_max{_format_labels(labels)} {maximum:.6f}")
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"{prefix}_{name}_total{_format_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        lines.append(f"{prefix}_{name}{_format_labels(labels)} {value}")
+    for cache, rate in sorted(cache_hit_rates().items()):
+        lines.append(f"{prefix}_cache_hit_ratio{_format_labels({}, cache=cache)} {rate:.4f}")
+    return "\n".join(lines) + "\n"
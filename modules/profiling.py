@@ -0,0 +1,42 @@
+# profiling.py
+
+# Startup profiling: set BIBLOS_PROFILE_STARTUP=1 to record and print how long each
+# heavy import and one-time resource initialization takes.
+
+import os
+import time
+import importlib
+from contextlib import contextmanager
+
+PROFILE_STARTUP = os.getenv("BIBLOS_PROFILE_STARTUP") == "1"
+
+startup_timings = {}
+
+@contextmanager
+def profile_startup(name):
+    # Each name is recorded once per process: Streamlit re-executes app.py on every
+    # rerun, and a warm re-import must not overwrite the cold-start figure
+    if not PROFILE_STARTUP or name in startup_timings:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        startup_timings[name] = elapsed_ms
+        print(f"[startup] {name}: {elapsed_ms:.1f} ms")
+
+def profile_imports(*module_names):
+    # Imports heavy dependencies up front so each one's cost is measured on its own
+    # rather than folded into whichever module happens to import it first
+    if not PROFILE_STARTUP:
+        return
+    for module_name in module_names:
+        if f"import {module_name}" in startup_timings:
+            continue
+        with profile_startup(f"import {module_name}"):
+            importlib.import_module(module_name)
+
+def startup_report():
+    return dict(sorted(startup_timings.items(), key=lambda item: item[1], reverse=True))
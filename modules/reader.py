@@ -1,31 +1,45 @@
 # reader.py
 import streamlit as st
-import xml.etree.ElementTree as ET
-from config import BIBLE_BOOK_NAMES, BIBLE_XML_FILE
+from config import BIBLE_BOOK_NAMES, BIBLE_XML_FILE, BIBLE_STORE_FILE, CHAPTER_HTML_CACHE_SIZE
+from modules import bible_store
+from modules.profiling import profile_startup
+from modules import metrics
+from functools import lru_cache
 import re
 
+HIGHLIGHT_STYLE = "background-color: #FFD700; color: #000000;"
+
 def preprocess_text(text):
     text = re.sub(r'^\d+\s|\s\d+\s', ' ', text)
     text = re.sub(r'\s+', ' ', text).strip()
     text = re.sub(r'[^\w\s]', '', text.lower())
     return text
 
-@st.cache_resource
-def load_bible_xml(input_file):
-    tree = ET.parse(input_file)
-    root = tree.getroot()
-    return root
+@metrics.instrument_cache(st.cache_resource)
+def load_bible_store(store_file):
+    with profile_startup("open bible store"):
+        return bible_store.load_bible_store(store_file, BIBLE_XML_FILE)
 
-@st.cache_data
 def get_full_chapter_text(book_abbr, chapter):
-    bible_xml = load_bible_xml(BIBLE_XML_FILE)
-    query = f".//v[@b='{book_abbr}'][@c='{chapter}']"
-    verses = []
-    for verse in bible_xml.findall(query):
-        verse_num = verse.get('v')
-        text = verse.text
-        verses.append((verse_num, text))
-    return verses
+    return load_bible_store(BIBLE_STORE_FILE).chapter(book_abbr, chapter)
+
+def get_chapter_count(book_abbr):
+    return load_bible_store(BIBLE_STORE_FILE).chapter_count(book_abbr) or 1
+
+def get_verse_offset(book_abbr, chapter):
+    return load_bible_store(BIBLE_STORE_FILE).verse_offset(book_abbr, chapter)
+
+def find_result_verses(verses, book_abbr, chapter, result_doc):
+    # Verse numbers of the chapter covered by a search result. Indexes built by
+    # data/create_db.py record each chunk's verse range, so this is a range check;
+    # older indexes without it fall back to matching verse text against the chunk.
+    metadata = result_doc.metadata
+    if "verse_start" not in metadata or "verse_end" not in metadata:
+        return set(find_matching_verses(verses, result_doc.page_content))
+    if metadata.get("book") != book_abbr or int(metadata.get("chapter", 0)) != int(chapter):
+        return set()
+    verse_start, verse_end = int(metadata["verse_start"]), int(metadata["verse_end"])
+    return {verse_num for verse_num, verse_text in verses if verse_start <= int(verse_num) <= verse_end}
 
 def find_matching_verses(verses, search_content):
     search_content = ' '.join(search_content.split())
@@ -36,31 +50,33 @@ def find_matching_verses(verses, search_content):
             matching_verses.append(verse_num)
     return matching_verses
 
-@st.cache_data
-def split_content_into_paragraphs(content, lines_per_paragraph=5):
-    paragraphs = []
-    lines = content.split('\n')
-    current_paragraph = []
-    span_open = False
-    for line in lines:
-        if "<span" in line and "</span>" not in line:
-            span_open = True
-        current_paragraph.append(line)
-        if len(current_paragraph) >= lines_per_paragraph and not span_open:
-            paragraphs.append("\n".join(current_paragraph))
-            current_paragraph = []
-        if "</span>" in line:
-            span_open = False
-    if current_paragraph:
-        paragraphs.append("\n".join(current_paragraph))
-    return paragraphs
+@lru_cache(maxsize=CHAPTER_HTML_CACHE_SIZE)
+def render_chapter_fragments(book_abbr, chapter):
+    # Per-verse markup for a chapter, rendered once and shared by every rerun
+    return tuple(
+        (verse_num, f"<sup>{verse_num}</sup> {verse_text}")
+        for verse_num, verse_text in get_full_chapter_text(book_abbr, chapter)
+    )
+
+@lru_cache(maxsize=CHAPTER_HTML_CACHE_SIZE)
+def render_chapter_html(book_abbr, chapter):
+    return "".join(f"{fragment} " for verse_num, fragment in render_chapter_fragments(book_abbr, chapter))
+
+def render_highlighted_chapter(book_abbr, chapter, highlighted_verses=()):
+    # Highlights are overlaid on the cached fragments, so no highlight variant is cached.
+    # Chapters arrive as int or str depending on the caller; one key per chapter.
+    chapter = int(chapter)
+    if not highlighted_verses:
+        return render_chapter_html(book_abbr, chapter)
+    return "".join(
+        f'<span style="{HIGHLIGHT_STYLE}">{fragment}</span> ' if verse_num in highlighted_verses else f"{fragment} "
+        for verse_num, fragment in render_chapter_fragments(book_abbr, chapter)
+    )
 
 def update_chapter():
     st.session_state.current_chapter = st.session_state.chapter_select
 
 def reader_mode_navigation():
-    bible_xml = load_bible_xml(BIBLE_XML_FILE)
-
     if 'current_book' not in st.session_state:
         st.session_state.current_book = list(BIBLE_BOOK_NAMES.keys())[0]
     if 'current_chapter' not in st.session_state:
@@ -78,6 +94,6 @@ def reader_mode_navigation():
         st.session_state.current_book = selected_book
         st.session_state.current_chapter = 1
 
-    max_chapters = max(int(verse.get('c')) for verse in bible_xml.findall(f".//v[@b='{st.session_state.current_book}']"))
+    max_chapters = get_chapter_count(st.session_state.current_book)
     with col2:
         chapter = st.number_input("Chapter", min_value=1, max_value=max_chapters, value=st.session_state.current_chapter, key="chapter_select", on_change=update_chapter)
\ No newline at end of file
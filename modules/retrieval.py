@@ -0,0 +1,377 @@
+# retrieval.py
+
+# Streamlit-free search core shared by the app (modules/search.py) and the
+# headless search service (service.py). Everything here is cached per process.
+
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from modules.embeddings import BatchedInstructEmbeddings, CachedEmbeddings, create_embedding_cache, load_instructor_model
+from modules.embedding_scheduler import EmbeddingBatcher
+from modules.bible_store import load_bible_store
+from modules.vector_store import NumpyVectorStore, VerseEmbeddings
+from modules.lexical import BM25Index
+from modules.profiling import profile_startup, startup_report
+from modules import metrics
+from config import *
+import threading
+import time
+import os
+
+def load_once(func):
+    # lru_cache whose first call is serialized: warm-up runs in the background, and a
+    # query arriving meanwhile must wait for the model or store it is loading rather
+    # than load a second copy
+    cached = lru_cache(maxsize=None)(func)
+    lock = threading.Lock()
+
+    @wraps(func)
+    def wrapper(*args):
+        with lock:
+            return cached(*args)
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@load_once
+def get_embedding_cache():
+    return create_embedding_cache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DB, EMBEDDING_CACHE_TTL_SECONDS, EMBEDDING_CACHE_MAX_ROWS)
+
+@load_once
+def load_embedding_model():
+    with profile_startup("load embedding model"):
+        return load_instructor_model(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_THREADS)
+
+@load_once
+def get_embedding_batcher():
+    model = load_embedding_model()
+
+    def encode(pairs):
+        # batch_size is merged in so an encode_kwargs batch_size cannot collide with it
+        return model.client.encode(pairs, **{**model.encode_kwargs, "batch_size": len(pairs)}).tolist()
+
+    return EmbeddingBatcher(
+        encode,
+        max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+    )
+
+@load_once
+def get_query_embeddings(query_instruction):
+    # Every store shares one model instance, one batcher and one cache
+    embeddings = BatchedInstructEmbeddings(load_embedding_model(), query_instruction, get_embedding_batcher(), EMBEDDING_BACKEND)
+    return CachedEmbeddings(embeddings, get_embedding_cache())
+
+@load_once
+def setup_db(persist_directory, query_instruction):
+    with profile_startup(f"open {persist_directory}"):
+        db = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=get_query_embeddings(query_instruction),
+        )
+    return db
+
+@load_once
+def setup_bible_db():
+    if BIBLE_VECTOR_BACKEND == "numpy":
+        with profile_startup(f"open {NUMPY_DB_DIR}"):
+            return NumpyVectorStore(NUMPY_DB_DIR, get_query_embeddings(DB_QUERY))
+    return setup_db(DB_DIR, DB_QUERY)
+
+@load_once
+def get_bible_store():
+    with profile_startup("open bible store"):
+        return load_bible_store(BIBLE_STORE_FILE, BIBLE_XML_FILE)
+
+@load_once
+def get_verse_embeddings():
+    # Optional: without the verse matrix, Bible results carry no verse hits
+    if not os.path.exists(VERSE_EMBEDDINGS_FILE):
+        return None
+    with profile_startup("open verse embeddings"):
+        try:
+            return VerseEmbeddings(VERSE_EMBEDDINGS_FILE, get_bible_store().verse_count)
+        except ValueError as exc:
+            print(f"Verse re-ranking disabled: {exc}")
+            return None
+
+@load_once
+def get_lexical_index(index_dir):
+    with profile_startup(f"open {index_dir}"):
+        return BM25Index(index_dir)
+
+@load_once
+def get_search_executor():
+    return ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+
+@load_once
+def get_author_search_executor():
+    # Kept separate from the source pool so author lookups queued from a source
+    # task can never wait on a pool their own caller is occupying
+    return ThreadPoolExecutor(max_workers=len(CHURCH_FATHERS), thread_name_prefix="author-search")
+
+def collect_result(future, source, deadline, failures=None):
+    # A source that fails or misses the deadline yields [] and, if a failures
+    # list is given, is recorded in it
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except TimeoutError:
+        metrics.increment("search_timeouts", source=source)
+        print(f"{source} search timed out after {SEARCH_TIMEOUT_SECONDS} seconds")
+    except Exception as exc:
+        metrics.increment("search_errors", source=source)
+        print(f"{source} search generated an exception: {exc}")
+    if failures is not None:
+        failures.append(source)
+    return []
+
+def get_selected_bible_filters(ot, nt):
+    if ot != nt:
+        return {"testament": "OT" if ot else "NT"}
+    return {}
+
+def search_bible(search_query, ot_checkbox, nt_checkbox, count):
+    if SEARCH_MODE == "lexical":
+        return perform_lexical_bible_search(get_lexical_index(LEXICAL_BIBLE_INDEX_DIR), search_query, ot_checkbox, nt_checkbox, count)
+    bible_db = setup_bible_db()
+    results = perform_bible_search(bible_db, search_query, ot_checkbox, nt_checkbox, count)
+    if SEARCH_MODE == "hybrid":
+        # A missing or broken lexical index must not cost the vector results
+        try:
+            lexical_results = perform_lexical_bible_search(get_lexical_index(LEXICAL_BIBLE_INDEX_DIR), search_query, ot_checkbox, nt_checkbox, count)
+        except Exception as exc:
+            metrics.increment("search_errors", source="Lexical")
+            print(f"Lexical search generated an exception, using vector results only: {exc}")
+            return results
+        results = reciprocal_rank_fusion([results, lexical_results], count)
+    return results
+
+def search_commentary(search_query):
+    # Hybrid mode keeps vector commentary search: its relevance threshold is a cosine score
+    if SEARCH_MODE == "lexical":
+        return perform_lexical_commentary_search(get_lexical_index(LEXICAL_COMMENTARY_INDEX_DIR), search_query)
+    commentary_db = setup_db(COMMENTARY_DB_DIR, COMMENTARY_DB_QUERY)
+    return perform_commentary_search(commentary_db, search_query)
+
+def run_search(search_query, ot_checkbox, nt_checkbox, count, enable_commentary, wrap=None, failures=None):
+    # Run the Bible and commentary searches side by side; a source that misses
+    # its deadline contributes no results rather than holding up the other.
+    # wrap(func, *args) lets callers run each task inside their own context, and
+    # the sources that failed are appended to failures so callers do not cache
+    # an incomplete result.
+    executor = get_search_executor()
+    wrap = wrap or (lambda func, *args: func(*args))
+    deadline = time.monotonic() + SEARCH_TIMEOUT_SECONDS
+
+    bible_future = executor.submit(wrap, search_bible, search_query, ot_checkbox, nt_checkbox, count)
+    commentary_future = None
+    if enable_commentary:
+        commentary_future = executor.submit(wrap, search_commentary, search_query)
+
+    bible_search_results = collect_result(bible_future, "Bible", deadline, failures)
+    commentary_results = []
+    if commentary_future:
+        commentary_results = collect_result(commentary_future, "Commentary", deadline, failures)
+
+    return bible_search_results, commentary_results
+
+@metrics.timed("perform_bible_search")
+def perform_bible_search(bible_db, search_query, ot_checkbox, nt_checkbox, count):
+    # Chunk retrieval, then verse re-ranking inside the retrieved chunks with the
+    # same query embedding
+    query_embedding = bible_db.embeddings.embed_query(search_query)
+    results = bible_search_by_vector(
+        bible_db,
+        query_embedding,
+        k=count,
+        filter=get_selected_bible_filters(ot_checkbox, nt_checkbox),
+    )
+    add_verse_hits(results, query_embedding)
+    return results
+
+def chunk_verse_indices(bible_store, metadata):
+    # Store indices of the verses a chunk covers; chunks from indexes without a
+    # verse range are searched across their whole chapter
+    indices = bible_store.verse_indices(metadata["book"], metadata["chapter"])
+    if "verse_start" not in metadata or "verse_end" not in metadata:
+        return indices
+    verse_start, verse_end = int(metadata["verse_start"]), int(metadata["verse_end"])
+    return [i for i in indices if verse_start <= bible_store.verse_num(i) <= verse_end]
+
+@metrics.timed("rank_verses")
+def add_verse_hits(results, query_embedding, limit=VERSE_HITS_PER_RESULT):
+    # Adds metadata["verse_hits"]: the chunk's best verses as [{"verse", "score"}]
+    verse_embeddings = get_verse_embeddings()
+    if verse_embeddings is None or not results:
+        return results
+    bible_store = get_bible_store()
+    index_groups = [chunk_verse_indices(bible_store, doc.metadata) for doc, score in results]
+    ranked = verse_embeddings.rank(index_groups, query_embedding, limit)
+    for (doc, score), verse_hits in zip(results, ranked):
+        doc.metadata["verse_hits"] = [
+            {"verse": bible_store.verse_num(index), "score": verse_score}
+            for index, verse_score in verse_hits
+        ]
+    return results
+
+def bible_search_by_vector(bible_db, embedding, k, filter=None):
+    # (Document, relevance score) tuples for an already-computed query embedding
+    if isinstance(bible_db, NumpyVectorStore):
+        return bible_db.search_by_vector(embedding, k=k, filter=filter)
+    relevance_score_fn = bible_db._select_relevance_score_fn()
+    results = bible_db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+    return [(doc, relevance_score_fn(distance)) for doc, distance in results]
+
+@metrics.timed("perform_commentary_search")
+def perform_commentary_search(commentary_db, search_query):
+    # Embed once, then find each author's best passage from a single over-fetched
+    # vector search instead of one embedding and filtered search per author
+    query_embedding = commentary_db.embeddings.embed_query(search_query)
+    relevance_score_fn = commentary_db._select_relevance_score_fn()
+
+    def search_by_vector(k, filter=None):
+        results = commentary_db.similarity_search_by_vector_with_relevance_scores(
+            query_embedding,
+            k=k,
+            filter=filter,
+        )
+        return [(doc, relevance_score_fn(distance)) for doc, distance in results]
+
+    best_by_author = {}
+    overfetch_k = len(CHURCH_FATHERS) * COMMENTARY_OVERFETCH
+    try:
+        results = search_by_vector(overfetch_k)
+    except Exception as exc:
+        # Fall back to one filtered search per author, as before the over-fetch
+        metrics.increment("search_errors", source="Commentary over-fetch")
+        print(f"Commentary over-fetch generated an exception, searching per author: {exc}")
+        results = None
+    for doc, score in results or []:
+        author = doc.metadata.get(FATHER_NAME)
+        if author in CHURCH_FATHERS and author not in best_by_author:
+            best_by_author[author] = (doc, score)
+
+    # An author missing from the over-fetch can only clear the threshold if the
+    # over-fetch was cut off while scores were still above it
+    if results is None or (len(results) == overfetch_k and results[-1][1] >= COMMENTARY_RELEVANCE_THRESHOLD):
+        executor = get_author_search_executor()
+        deadline = time.monotonic() + SEARCH_TIMEOUT_SECONDS
+        author_futures = {
+            author: executor.submit(search_by_vector, 1, {FATHER_NAME: author})
+            for author in CHURCH_FATHERS
+            if author not in best_by_author
+        }
+        for author, future in author_futures.items():
+            author_results = collect_result(future, f"Author ({author})", deadline)
+            if author_results:
+                best_by_author[author] = author_results[0]
+
+    return [
+        best_by_author[author]
+        for author in CHURCH_FATHERS
+        if author in best_by_author and best_by_author[author][1] >= COMMENTARY_RELEVANCE_THRESHOLD
+    ]
+
+@metrics.timed("perform_lexical_bible_search")
+def perform_lexical_bible_search(lexical_index, search_query, ot_checkbox, nt_checkbox, count):
+    # BM25 over single verses, grouped into one result per chapter (ranked by its
+    # best verse) spanning that chapter's matching verses. Scores are relative to
+    # the best verse, so the top result scores 1.0.
+    verse_hits = lexical_index.search(
+        search_query,
+        k=LEXICAL_VERSE_CANDIDATES,
+        filter=get_selected_bible_filters(ot_checkbox, nt_checkbox),
+        min_idf=LEXICAL_MIN_IDF,
+    )
+    chapters = {}
+    for doc_id, score in verse_hits:
+        metadata = lexical_index.metadata(doc_id)
+        key = (metadata["book"], int(metadata["chapter"]))
+        if key not in chapters and len(chapters) == count:
+            continue
+        chapters.setdefault(key, (metadata["testament"], []))[1].append((int(metadata["verse"]), score))
+
+    if not chapters:
+        return []
+    best_score = verse_hits[0][1]
+    bible_store = get_bible_store()
+    results = []
+    for (book, chapter), (testament, hits) in chapters.items():
+        verse_start = min(verse for verse, score in hits)
+        verse_end = max(verse for verse, score in hits)
+        verses = [
+            (int(verse_num), text) for verse_num, text in bible_store.chapter(book, chapter)
+            if verse_start <= int(verse_num) <= verse_end
+        ]
+        doc = Document(
+            page_content="".join(f"{text}\n" for verse_num, text in verses),
+            metadata={
+                "book": book,
+                "chapter": chapter,
+                "verse_nums": ",".join(str(verse_num) for verse_num, text in verses),
+                "verse_start": verse_start,
+                "verse_end": verse_end,
+                "testament": testament,
+                "verse_hits": [{"verse": verse, "score": score / best_score} for verse, score in hits[:VERSE_HITS_PER_RESULT]],
+            },
+        )
+        results.append((doc, hits[0][1] / best_score))
+    return results
+
+@metrics.timed("perform_lexical_commentary_search")
+def perform_lexical_commentary_search(lexical_index, search_query):
+    # Each author's best BM25 passage, scored relative to the best passage overall.
+    # Passages below LEXICAL_COMMENTARY_MIN_SCORE are dropped, so a query that only
+    # shares common words with the commentaries returns nothing.
+    best_by_author = {}
+    ranked = lexical_index.ranked(search_query, min_idf=LEXICAL_MIN_IDF)
+    for doc_id, score in ranked:
+        if score < LEXICAL_COMMENTARY_MIN_SCORE:
+            break
+        metadata = lexical_index.metadata(doc_id)
+        author = metadata.get(FATHER_NAME)
+        if author in CHURCH_FATHERS and author not in best_by_author:
+            best_by_author[author] = (Document(page_content=lexical_index.documents[doc_id], metadata=metadata), score / ranked[0][1])
+            if len(best_by_author) == len(CHURCH_FATHERS):
+                break
+    return [best_by_author[author] for author in CHURCH_FATHERS if author in best_by_author]
+
+def reciprocal_rank_fusion(result_lists, count, k=RRF_K):
+    # Fuses ranked Bible results keyed by (book, chapter): each list adds
+    # 1 / (k + rank) for the best rank it gives a chapter. A chapter keeps the
+    # document of the first list that returned it, and the fused score is scaled
+    # so a chapter ranked first by every list scores 1.0.
+    fused = {}
+    for results in result_lists:
+        seen = set()
+        for rank, (doc, score) in enumerate(results, start=1):
+            key = (doc.metadata["book"], int(doc.metadata["chapter"]))
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = fused.setdefault(key, [0.0, doc])
+            entry[0] += 1 / (k + rank)
+
+    best_possible = len(result_lists) / (k + 1)
+    ranked = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)[:count]
+    return [(doc, fused_score / best_possible) for fused_score, doc in ranked]
+
+def get_stats():
+    stats = {
+        "embedding_cache": get_embedding_cache().stats(),
+        "startup_ms": startup_report(),
+        "metrics": metrics.snapshot(),
+    }
+    if SEARCH_MODE != "lexical":
+        stats["embedding_batcher"] = get_embedding_batcher().stats()
+    return stats
+
+def get_chapter(book, chapter):
+    return get_bible_store().chapter(book, chapter)
+
+def result_to_dict(result):
+    return {"content": result[0].page_content, "metadata": result[0].metadata, "score": result[1]}
+
+def result_from_dict(data):
+    return Document(page_content=data["content"], metadata=data["metadata"]), data["score"]
@@ -1,60 +1,92 @@
 # search.py
 
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceInstructEmbeddings
+from modules import metrics, retrieval, warmup
+from modules.retrieval import result_from_dict, result_to_dict
 from config import *
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import streamlit as st
+import requests
+import threading
 
-@st.cache_resource
-def setup_db(persist_directory, query_instruction):
-    embeddings = HuggingFaceInstructEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        query_instruction=query_instruction,
-    )
-    db = Chroma(
-        persist_directory=persist_directory,
-        embedding_function=embeddings,
-    )
-    return db
+class IncompleteSearch(Exception):
+    # Raised from cached_search when a source failed, so Streamlit does not cache
+    # the partial results; perform_search still shows them
+    def __init__(self, results):
+        super().__init__(f"search sources failed: {', '.join(results['failed'])}")
+        self.results = results
 
-def get_selected_bible_filters(ot, nt):
-    if ot != nt:
-        return {"testament": "OT" if ot else "NT"}
-    return {}
-
-def perform_search(search_query, ot_checkbox, nt_checkbox, count):
-    bible_db = setup_db(DB_DIR, DB_QUERY)
-    bible_search_results = perform_bible_search(bible_db, search_query, ot_checkbox, nt_checkbox, count)
+@metrics.instrument_cache(st.cache_resource)
+def start_warmup():
+    # Warms the in-process model and stores once per server process. Streamlit has
+    # no server-start hook, so this runs on the first script run; only service.py
+    # offers a readiness check (see README).
+    if not SEARCH_SERVICE_URL:
+        warmup.start_warmup()
 
-    commentary_results = []
-    if st.session_state.enable_commentary:
-        commentary_db = setup_db(COMMENTARY_DB_DIR, COMMENTARY_DB_QUERY)
-        commentary_results = perform_commentary_search(commentary_db, search_query)
+@metrics.instrument_cache(st.cache_resource)
+def get_service_session():
+    return requests.Session()
 
-    return bible_search_results, commentary_results
+def run_in_context(ctx, func, *args):
+    if ctx:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    return func(*args)
 
-@st.cache_data
-def perform_bible_search(_bible_db, search_query, ot_checkbox, nt_checkbox, count):
-    return _bible_db.similarity_search_with_relevance_scores(
-        search_query,
-        k=count,
-        filter=get_selected_bible_filters(ot_checkbox, nt_checkbox),
+@metrics.timed("perform_search")
+def perform_search(search_query, ot_checkbox, nt_checkbox, count):
+    enable_commentary = st.session_state.enable_commentary
+    try:
+        results = cached_search(search_query, ot_checkbox, nt_checkbox, count, enable_commentary)
+    except IncompleteSearch as exc:
+        results = exc.results
+    except requests.RequestException as exc:
+        print(f"Search service request failed: {exc}")
+        return [], []
+    return (
+        [result_from_dict(r) for r in results["bible"]],
+        [result_from_dict(r) for r in results["commentary"]],
     )
 
-def perform_commentary_search(commentary_db, search_query):
-    search_results = []
-    for author in CHURCH_FATHERS:
-        try:
-            results = commentary_db.similarity_search_with_relevance_scores(
-                search_query,
-                k=1,
-                filter={FATHER_NAME: author},
-            )
-            if results and results[0][1] >= 0.80:
-                search_results.extend(results)
-        except Exception as exc:
-            print(f"Author search generated an exception for {author}: {exc}")
-    return search_results
+@metrics.instrument_cache(st.cache_data(max_entries=SEARCH_RESULT_CACHE_SIZE, show_spinner=False))
+def cached_search(search_query, ot_checkbox, nt_checkbox, count, enable_commentary):
+    # Reruns from checkbox toggles, "Show more" and reader navigation reuse the
+    # results of an identical search. Results are cached as plain dicts; a failed
+    # service request or a source that failed or timed out raises, so an empty or
+    # partial result is never cached.
+    if SEARCH_SERVICE_URL:
+        results = perform_service_search(search_query, ot_checkbox, nt_checkbox, count, enable_commentary)
+    else:
+        ctx = get_script_run_ctx()
+        run_task = metrics.bind_run(run_in_context)
+        failures = []
+        bible_results, commentary_results = retrieval.run_search(
+            search_query, ot_checkbox, nt_checkbox, count, enable_commentary,
+            wrap=lambda func, *args: run_task(ctx, func, *args),
+            failures=failures,
+        )
+        results = {
+            "bible": [result_to_dict(r) for r in bible_results],
+            "commentary": [result_to_dict(r) for r in commentary_results],
+            "failed": failures,
+        }
+    if results.get("failed"):
+        raise IncompleteSearch(results)
+    return results
+
+def perform_service_search(search_query, ot_checkbox, nt_checkbox, count, enable_commentary):
+    response = get_service_session().get(
+        f"{SEARCH_SERVICE_URL}/search",
+        params={
+            "q": search_query,
+            "ot": ot_checkbox,
+            "nt": nt_checkbox,
+            "count": count,
+            "commentary": enable_commentary,
+        },
+        timeout=SEARCH_TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+    return response.json()
 
 def format_bible_results(bible_search_results):
     return [
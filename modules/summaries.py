@@ -3,86 +3,196 @@
 import streamlit as st
 from config import BIBLE_SUMMARY_PROMPT, COMMENTARY_SUMMARY_PROMPT, LLM_ERROR
 from modules.search import format_bible_results, format_commentary_results
+from modules.llm_client import LLMClient, LLMError
+from modules.cache import DiskCache, TieredCache
+from modules import metrics
 from config import *
+from concurrent.futures import ThreadPoolExecutor
 import requests
+import hashlib
+import json
+import queue
 import os 
 
-@st.cache_resource
+@metrics.instrument_cache(st.cache_resource)
 def setup_llm():
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         print("No API token found, so LLM support is disabled.")
         return None
     
-    return {
-        "api_url": API_URL,
-        "headers": {
+    return LLMClient(
+        api_url=os.getenv("ANTHROPIC_API_URL", API_URL),
+        headers={
             "x-api-key": api_key,
             "content-type": "application/json",
             "anthropic-version": "2023-06-01"
         },
-        "model": LLM_MODEL_NAME,
-    }
+        model=LLM_MODEL_NAME,
+        max_tokens=256,
+    )
 
-def invoke_llm(llm, prompt):
-    if not llm:
-        st.error(LLM_ERROR)
-        return None
-    
-    data = {
-        "model": llm["model"],
-        "max_tokens": 256,
-        "temperature": 0.0,
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    
-    try:
-        response = requests.post(llm["api_url"], headers=llm["headers"], json=data)
-        response.raise_for_status()
-        return response.json()["content"][0]["text"]
-    except requests.RequestException as e:
-        st.error(f"Error invoking LLM: {str(e)}")
-        return None
+@metrics.instrument_cache(st.cache_resource)
+def get_llm_executor():
+    return ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
 
-def generate_summaries(search_query, bible_search_results, commentary_results):
-    llm = setup_llm()
-    if not llm:
-        st.error(LLM_ERROR)
-        return {}
+@metrics.instrument_cache(st.cache_resource)
+def get_summary_cache():
+    disk_cache = None
+    if SUMMARY_CACHE_DB:
+        disk_cache = DiskCache(SUMMARY_CACHE_DB, ttl=SUMMARY_CACHE_TTL_SECONDS)
+        disk_cache.purge_expired()
+    return TieredCache(SUMMARY_CACHE_SIZE, disk_cache)
 
-    summaries = {}
+def report_summary_cache_stats(cache):
+    # Published as gauges for the debug panel, since the st.cache_resource hit rate
+    # of get_summary_cache says nothing about summary reuse
+    stats = cache.stats()
+    metrics.set_gauge("summary_cache_hit_ratio", round(stats["hit_rate"], 4))
+    metrics.set_gauge("summary_cache_size", stats["size"])
+    for outcome in ("hits", "disk_hits", "misses"):
+        metrics.set_gauge("summary_cache_lookups", stats[outcome], outcome=outcome)
+
+def passage_id(label, content):
+    return f"{label}#{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}"
+
+def summary_cache_key(model, template, search_query, passage_ids):
+    key = json.dumps([model, template, search_query, passage_ids], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def build_summary_prompts(llm, search_query, bible_search_results, commentary_results):
+    # Returns {summary: (prompt, cache_key)}
+    prompts = {}
     
-    # Generate Bible summary
+    # Bible summary prompt
     if bible_search_results:
         bible_passages = []
+        passage_ids = []
         for result in bible_search_results:
             content = result[0].page_content
             book = BIBLE_BOOK_NAMES.get(result[0].metadata['book'], result[0].metadata['book'])
             chapter = result[0].metadata['chapter']
             bible_passages.append(f"Source: {book} {chapter}\nContent: {content}")
+            passage_ids.append(passage_id(f"{result[0].metadata['book']} {chapter}", content))
         
         all_results = "\n\n".join(bible_passages)
-        llm_query = BIBLE_SUMMARY_PROMPT.format(topic=search_query, passages=all_results)
-        bible_summary = invoke_llm(llm, llm_query)
-        if bible_summary:
-            summaries['bible'] = bible_summary
+        prompts['bible'] = (
+            BIBLE_SUMMARY_PROMPT.format(topic=search_query, passages=all_results),
+            summary_cache_key(llm.model, BIBLE_SUMMARY_PROMPT, search_query, passage_ids),
+        )
     
-    # Generate Commentary summary if enabled
+    # Commentary summary prompt if enabled
     if st.session_state.enable_commentary and commentary_results:
         commentary_passages = []
+        passage_ids = []
         for result in commentary_results:
             content = result[0].page_content
             author = result[0].metadata['father_name']
             source = result[0].metadata['source_title']
             commentary_passages.append(f"Source: {author} - {source}\nContent: {content}")
+            passage_ids.append(passage_id(str(result[0].metadata.get('id', author)), content))
         
         all_results = "\n\n".join(commentary_passages)
-        llm_query = COMMENTARY_SUMMARY_PROMPT.format(topic=search_query, content=all_results)
-        commentary_summary = invoke_llm(llm, llm_query)
-        if commentary_summary:
-            summaries['commentary'] = commentary_summary
+        prompts['commentary'] = (
+            COMMENTARY_SUMMARY_PROMPT.format(topic=search_query, content=all_results),
+            summary_cache_key(llm.model, COMMENTARY_SUMMARY_PROMPT, search_query, passage_ids),
+        )
     
-    return summaries
+    return prompts
+
+def generate_summaries(search_query, bible_search_results, commentary_results):
+    llm = setup_llm()
+    if not llm:
+        st.error(LLM_ERROR)
+        return {}
+
+    prompts = build_summary_prompts(llm, search_query, bible_search_results, commentary_results)
+    cache = get_summary_cache()
+    executor = get_llm_executor()
+
+    @metrics.bind_run
+    def complete(prompt):
+        with metrics.timed("invoke_llm", mode="complete"):
+            return llm.complete(prompt)
+
+    summaries = {}
+    futures = {}
+    for key, (prompt, cache_key) in prompts.items():
+        cached = cache.get(cache_key)
+        if cached:
+            summaries[key] = cached
+        else:
+            futures[key] = executor.submit(complete, prompt)
+    report_summary_cache_stats(cache)
+
+    for key, future in futures.items():
+        try:
+            summaries[key] = future.result()
+            cache.put(prompts[key][1], summaries[key])
+        except (requests.RequestException, LLMError) as e:
+            st.error(f"Error invoking LLM: {str(e)}")
+    return {key: summaries[key] for key in prompts if key in summaries}
+
+def stream_summaries(search_query, bible_search_results, commentary_results):
+    # Streams the Bible and commentary summaries concurrently, rendering tokens
+    # into their own placeholders as they arrive
+    llm = setup_llm()
+    if not llm:
+        st.error(LLM_ERROR)
+        return {}
+
+    prompts = build_summary_prompts(llm, search_query, bible_search_results, commentary_results)
+    cache = get_summary_cache()
+    placeholders = {key: st.empty() for key in prompts}
+    summaries = {key: "" for key in prompts}
+    failed = set()
+    events = queue.Queue()
+
+    @metrics.bind_run
+    def produce(key, prompt):
+        try:
+            with metrics.timed("invoke_llm", mode="stream"):
+                for text in llm.stream(prompt):
+                    events.put((key, text, None))
+        except Exception as e:
+            # Any failure, including a truncated stream, marks the summary as failed
+            # so the partial text is not cached
+            events.put((key, None, e))
+        finally:
+            events.put((key, None, None))
+
+    executor = get_llm_executor()
+    pending = 0
+    for key, (prompt, cache_key) in prompts.items():
+        cached = cache.get(cache_key)
+        if cached:
+            summaries[key] = cached
+            placeholders[key].success(cached)
+        else:
+            placeholders[key].info("Generating insights...")
+            executor.submit(produce, key, prompt)
+            pending += 1
+    report_summary_cache_stats(cache)
+
+    while pending:
+        key, text, error = events.get()
+        if text:
+            summaries[key] += text
+            placeholders[key].success(summaries[key])
+        elif error:
+            failed.add(key)
+            placeholders[key].error(f"Error invoking LLM: {str(error)}")
+        else:
+            pending -= 1
+            if key in failed:
+                continue
+            if summaries[key]:
+                cache.put(prompts[key][1], summaries[key])
+            else:
+                # Replace "Generating insights..." when the model returned no text
+                placeholders[key].warning("No summary was generated.")
+
+    return {key: summary for key, summary in summaries.items() if summary}
 
 def display_summaries(search_query, bible_results, commentary_results):
     summaries = generate_summaries(search_query, bible_results, commentary_results)
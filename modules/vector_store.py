@@ -0,0 +1,110 @@
+# vector_store.py
+
+# Exact brute-force vector search over embeddings exported from a Chroma store.
+# At a few thousand vectors one matrix-vector product beats HNSW with metadata
+# filtering on both speed and accuracy.
+#
+# Directory layout (written by export_chroma_collection):
+#   embeddings.npy  row-normalized float32 or float16 matrix, opened memory-mapped
+#   documents.json  page content per row
+#   metadata.json   columnar metadata: {field: [value per row]}
+
+import os
+import json
+import numpy as np
+from langchain_core.documents import Document
+
+
+def export_chroma_collection(collection, output_dir, dtype="float32"):
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    fields = sorted({key for metadata in data["metadatas"] for key in metadata})
+    columns = {field: [metadata.get(field) for metadata in data["metadatas"]] for field in fields}
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "embeddings.npy"), matrix.astype(dtype))
+    with open(os.path.join(output_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump(data["documents"], f, ensure_ascii=False)
+    with open(os.path.join(output_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f, ensure_ascii=False)
+    return matrix.shape
+
+
+class NumpyVectorStore:
+    def __init__(self, directory, embedding_function):
+        self.embeddings = embedding_function
+        self.matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "documents.json"), encoding="utf-8") as f:
+            self.documents = json.load(f)
+        with open(os.path.join(directory, "metadata.json"), encoding="utf-8") as f:
+            self.columns = json.load(f)
+        self._filter_columns = {}
+
+    def _column(self, field):
+        if field not in self._filter_columns:
+            self._filter_columns[field] = np.asarray(self.columns.get(field, [None] * len(self.documents)), dtype=object)
+        return self._filter_columns[field]
+
+    def _mask(self, filter):
+        mask = None
+        for field, value in (filter or {}).items():
+            field_mask = self._column(field) == value
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def _document(self, row):
+        metadata = {field: values[row] for field, values in self.columns.items() if values[row] is not None}
+        return Document(page_content=self.documents[row], metadata=metadata)
+
+    def search_by_vector(self, embedding, k=4, filter=None):
+        # Scores are cosine similarities, matching Chroma's cosine relevance scores
+        query = np.array(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        # float16 matrices are upcast for the product so scores accumulate in float32
+        scores = np.dot(self.matrix, query)
+
+        mask = self._mask(filter)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(row), float(scores[row])) for row in top]
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+        embedding = self.embeddings.embed_query(query)
+        return self.search_by_vector(embedding, k=k, filter=filter)
+
+
+class VerseEmbeddings:
+    # Row-normalized verse embedding matrix whose rows line up with BibleStore verse
+    # indices (written by data/create_verse_embeddings.py), used to find the verses
+    # inside retrieved chunks that best match an already-computed query embedding
+    def __init__(self, path, verse_count):
+        self.matrix = np.load(path, mmap_mode="r")
+        if self.matrix.shape[0] != verse_count:
+            raise ValueError(f"{path} has {self.matrix.shape[0]} rows but the Bible store has {verse_count} verses")
+
+    def rank(self, index_groups, embedding, limit):
+        # One matrix-vector product over the verses of every group; returns the top
+        # (verse index, score) pairs of each group, best first
+        query = np.array(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        indices = np.fromiter((i for group in index_groups for i in group), dtype=np.int64)
+        scores = np.dot(self.matrix[indices], query) if len(indices) else np.empty(0, dtype=np.float32)
+
+        ranked = []
+        start = 0
+        for group in index_groups:
+            group_scores = scores[start:start + len(group)]
+            group_indices = indices[start:start + len(group)]
+            top = np.argsort(-group_scores)[:limit]
+            ranked.append([(int(group_indices[i]), float(group_scores[i])) for i in top])
+            start += len(group)
+        return ranked
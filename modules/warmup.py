@@ -0,0 +1,93 @@
+# warmup.py
+
+# Background warm-up: loads the embedding model, pulls the vector index files into
+# the page cache, opens both Chroma stores and runs a query through each, so the
+# first real search does not pay for any of it. is_ready() backs readiness checks.
+
+import os
+import threading
+import time
+from modules import retrieval
+from config import DB_DIR, NUMPY_DB_DIR, BIBLE_VECTOR_BACKEND, COMMENTARY_DB_DIR, COMMENTARY_DB_QUERY, DEFAULT_QUERIES
+from config import SEARCH_MODE, LEXICAL_BIBLE_INDEX_DIR, LEXICAL_COMMENTARY_INDEX_DIR
+
+_ready = threading.Event()
+_lock = threading.Lock()
+_thread = None
+_status = {"state": "idle", "steps": {}, "error": None}
+
+def touch_files(directory, chunk_size=1 << 20):
+    # Read every file once so the HNSW segments are resident before the first search
+    total = 0
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            with open(os.path.join(root, filename), "rb") as f:
+                while chunk := f.read(chunk_size):
+                    total += len(chunk)
+    return total
+
+def run_warmup():
+    query = DEFAULT_QUERIES[0]
+    lexical_steps = [
+        ("open bible lexical index", lambda: retrieval.get_lexical_index(LEXICAL_BIBLE_INDEX_DIR)),
+        ("open commentary lexical index", lambda: retrieval.get_lexical_index(LEXICAL_COMMENTARY_INDEX_DIR)),
+    ]
+    steps = [
+        ("touch bible index", lambda: touch_files(NUMPY_DB_DIR if BIBLE_VECTOR_BACKEND == "numpy" else DB_DIR)),
+        ("touch commentary index", lambda: touch_files(COMMENTARY_DB_DIR)),
+        ("load embedding model", retrieval.load_embedding_model),
+        ("open bible store", retrieval.get_bible_store),
+        ("open verse embeddings", retrieval.get_verse_embeddings),
+        ("open bible db", retrieval.setup_bible_db),
+        ("open commentary db", lambda: retrieval.setup_db(COMMENTARY_DB_DIR, COMMENTARY_DB_QUERY)),
+        ("bible query", lambda: retrieval.search_bible(query, True, True, 1)),
+        ("commentary query", lambda: retrieval.search_commentary(query)),
+    ]
+    if SEARCH_MODE == "lexical":
+        # Nothing to load for the model or the vector stores
+        steps = lexical_steps + [
+            ("open bible store", retrieval.get_bible_store),
+            ("bible query", lambda: retrieval.search_bible(query, True, True, 1)),
+            ("commentary query", lambda: retrieval.search_commentary(query)),
+        ]
+    elif SEARCH_MODE == "hybrid":
+        steps = lexical_steps[:1] + steps
+    _status["state"] = "running"
+    try:
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            _status["steps"][name] = round((time.perf_counter() - start) * 1000, 1)
+        _status["state"] = "ready"
+    except Exception as exc:
+        # Finished but not ready: a worker whose model or stores failed to load
+        # must not be sent traffic
+        print(f"Warm-up failed: {exc}")
+        _status["state"] = "failed"
+        _status["error"] = str(exc)
+    _ready.set()
+
+def start_warmup():
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+def is_ready():
+    return _ready.is_set() and _status["state"] == "ready"
+
+def wait_until_ready(timeout=None):
+    # Waits for warm-up to finish, successfully or not; returns whether it succeeded
+    _ready.wait(timeout)
+    return is_ready()
+
+def warmup_status():
+    return {"ready": is_ready(), **_status}
+
+if __name__ == "__main__":
+    # Warm the model download and OS page cache ahead of starting the server
+    start_warmup()
+    wait_until_ready()
+    print(warmup_status())
@@ -0,0 +1,76 @@
+# service.py
+
+# Headless search service over the same Chroma stores and embedding model as the app.
+#   uvicorn service:app --port 8000 --workers 2
+#   BIBLOS_SEARCH_SERVICE_URL=http://localhost:8000 streamlit run app.py
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from modules import metrics, retrieval, warmup
+from modules.retrieval import result_to_dict
+from config import *
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedding model and open both stores once per worker, in the
+    # background so the worker can answer /health and /ready meanwhile
+    warmup.start_warmup()
+    yield
+
+app = FastAPI(title="Biblos Search Service", lifespan=lifespan)
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    # Load balancers should hold traffic until this returns 200
+    return JSONResponse(warmup.warmup_status(), status_code=200 if warmup.is_ready() else 503)
+
+@app.get("/search")
+async def search(q: str, ot: bool = True, nt: bool = True, count: int = 4, commentary: bool = False):
+    # "failed" lists the sources that errored or timed out, so clients can tell
+    # an incomplete result from an empty one
+    failures = []
+    bible_results, commentary_results = await run_in_threadpool(
+        retrieval.run_search, q, ot, nt, count, commentary, failures=failures
+    )
+    return {
+        "bible": [result_to_dict(r) for r in bible_results],
+        "commentary": [result_to_dict(r) for r in commentary_results],
+        "failed": failures,
+    }
+
+@app.get("/commentary")
+async def commentary(q: str):
+    results = await run_in_threadpool(retrieval.search_commentary, q)
+    return {"commentary": [result_to_dict(r) for r in results]}
+
+@app.get("/chapter")
+async def chapter(book: str, chapter: int):
+    # May wait on the Bible store loader (or build the store), so off the event loop
+    verses = await run_in_threadpool(retrieval.get_chapter, book, chapter)
+    if not verses:
+        raise HTTPException(status_code=404, detail=f"{book} {chapter} not found")
+    return {
+        "book": book,
+        "chapter": chapter,
+        "verses": [{"verse": verse_num, "text": text} for verse_num, text in verses],
+    }
+
+@app.get("/stats")
+def stats():
+    return retrieval.get_stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Prometheus text exposition of the stage timers, counters and cache hit rates
+    cache_stats = retrieval.get_embedding_cache().stats()
+    metrics.set_gauge("embedding_cache_hit_ratio", round(cache_stats["hit_rate"], 4))
+    metrics.set_gauge("embedding_cache_size", cache_stats["size"])
+    if SEARCH_MODE != "lexical":
+        metrics.set_gauge("embedding_queue_depth", retrieval.get_embedding_batcher().stats()["queue_depth"])
+    return PlainTextResponse(metrics.prometheus_text())
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules import retrieval
+from config import DB_QUERY, BIBLE_VECTOR_BACKEND, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, SEARCH_MODE
+from test_queries import test_queries
+
+# Headless retrieval benchmark over the test_queries gold set. Reports recall@k and MRR
+# plus latency percentiles for query embedding, vector search and end-to-end search,
+# and writes them to JSON so two runs or two index builds can be diffed.
+# Run from the repository root:
+#   python test/benchmark.py -o before.json
+#   python test/benchmark.py --compare before.json after.json
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-k", type=int, default=4, help="number of results per query (default: 4)")
+parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per query (default: 5)")
+parser.add_argument("-o", "--output", default=None, help="path to write the JSON results to")
+parser.add_argument("--commentary", action="store_true", help="include the commentary search in the end-to-end timing")
+parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two result files instead of running")
+args = parser.parse_args()
+
+
+def percentiles(samples_s):
+    samples_ms = np.array(samples_s) * 1000
+    return {
+        "p50": round(float(np.percentile(samples_ms, 50)), 2),
+        "p95": round(float(np.percentile(samples_ms, 95)), 2),
+        "p99": round(float(np.percentile(samples_ms, 99)), 2),
+        "mean": round(float(samples_ms.mean()), 2),
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def score_query(returned, expected):
+    hits = [chapter in expected for chapter in returned]
+    recall = len(set(returned) & set(expected)) / len(expected)
+    reciprocal_rank = next((1 / (rank + 1) for rank, hit in enumerate(hits) if hit), 0.0)
+    return recall, reciprocal_rank
+
+
+def run_benchmark():
+    # Measure real model cost: no disk cache, and the in-memory cache is cleared
+    # before every end-to-end run
+    retrieval.EMBEDDING_CACHE_DB = None
+    cache = retrieval.get_embedding_cache()
+    # Lexical mode never loads the model, so only the end-to-end stage applies
+    measure_vectors = SEARCH_MODE != "lexical"
+    if measure_vectors:
+        encoder = retrieval.get_query_embeddings(DB_QUERY).embeddings
+        bible_db = retrieval.setup_bible_db()
+
+    # One untimed pass to load the model and open the stores
+    retrieval.run_search(next(iter(test_queries)), True, True, args.k, args.commentary)
+
+    timings = {"embedding": [], "vector_search": [], "end_to_end": []}
+    queries = []
+    for query, expected in test_queries.items():
+        for _ in range(args.repeat):
+            if measure_vectors:
+                embedding, embed_s = timed(encoder.embed_query, query)
+                _, search_s = timed(retrieval.bible_search_by_vector, bible_db, embedding, args.k)
+                timings["embedding"].append(embed_s)
+                timings["vector_search"].append(search_s)
+            cache.memory.clear()
+            (results, _), end_to_end_s = timed(retrieval.run_search, query, True, True, args.k, args.commentary)
+            timings["end_to_end"].append(end_to_end_s)
+
+        returned = [f"{doc.metadata['book']} {doc.metadata['chapter']}" for doc, score in results]
+        recall, reciprocal_rank = score_query(returned, expected)
+        queries.append({
+            "query": query,
+            "expected": expected,
+            "returned": returned,
+            "recall": recall,
+            "reciprocal_rank": reciprocal_rank,
+        })
+        print(f"recall {recall:.2f}  rr {reciprocal_rank:.2f}  {query}")
+
+    return {
+        "config": {
+            "k": args.k,
+            "repeat": args.repeat,
+            "commentary": args.commentary,
+            "model": EMBEDDING_MODEL_NAME,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "vector_backend": BIBLE_VECTOR_BACKEND,
+            "search_mode": SEARCH_MODE,
+        },
+        "quality": {
+            f"recall@{args.k}": round(float(np.mean([q["recall"] for q in queries])), 4),
+            "mrr": round(float(np.mean([q["reciprocal_rank"] for q in queries])), 4),
+        },
+        "latency_ms": {stage: percentiles(samples) for stage, samples in timings.items() if samples},
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "queries": queries,
+    }
+
+
+def flatten(results):
+    metrics = dict(results["quality"])
+    for stage, values in results["latency_ms"].items():
+        for name, value in values.items():
+            metrics[f"{stage} {name} ms"] = value
+    metrics["peak_rss_mb"] = results["peak_rss_mb"]
+    return metrics
+
+
+def compare(baseline_file, candidate_file):
+    with open(baseline_file) as f:
+        baseline = flatten(json.load(f))
+    with open(candidate_file) as f:
+        candidate = flatten(json.load(f))
+    print(f"{'metric':<28}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for metric, before in baseline.items():
+        after = candidate.get(metric)
+        if after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+        print(f"{metric:<28}{before:>12}{after:>12}{change:>10}")
+
+
+if args.compare:
+    compare(*args.compare)
+else:
+    results = run_benchmark()
+    print(json.dumps({key: results[key] for key in ("quality", "latency_ms", "peak_rss_mb")}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from langchain_community.vectorstores import Chroma
+from modules.embeddings import load_instructor_model
+from config import DB_DIR, EMBEDDING_MODEL_NAME
+
+# Re-embeds a sample of the documents stored in data/db with the selected embedding
+# backend and reports the cosine drift from the fp32 embeddings stored alongside them.
+# Run from the repository root:
+#   python test/embedding_parity.py --backend int8 --threads 4
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--backend", default="int8", help="embedding backend to check (default: int8)")
+parser.add_argument("--threads", type=int, default=0, help="torch thread count, 0 for the default")
+parser.add_argument("--sample", type=int, default=200, help="number of stored documents to re-embed (default: 200)")
+parser.add_argument("--db_dir", default=DB_DIR, help=f"Chroma directory holding the reference embeddings (default: {DB_DIR})")
+args = parser.parse_args()
+
+stored = Chroma(persist_directory=args.db_dir)._collection.get(
+    include=["embeddings", "documents"], limit=args.sample
+)
+reference = np.array(stored["embeddings"], dtype=np.float32)
+
+then = time.perf_counter()
+model = load_instructor_model(EMBEDDING_MODEL_NAME, args.backend, args.threads)
+load_s = time.perf_counter() - then
+
+then = time.perf_counter()
+candidate = np.array(model.embed_documents(stored["documents"]), dtype=np.float32)
+embed_s = time.perf_counter() - then
+
+reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+candidate /= np.linalg.norm(candidate, axis=1, keepdims=True)
+cosine = np.sum(reference * candidate, axis=1)
+model_mb = sum(
+    t.numel() * t.element_size()
+    for t in list(model.client.parameters()) + list(model.client.buffers())
+) / 2**20
+
+print(f"backend: {args.backend}  documents: {len(cosine)}")
+print(f"cosine to stored fp32 embeddings: mean {cosine.mean():.5f}  min {cosine.min():.5f}  p5 {np.percentile(cosine, 5):.5f}")
+print(f"model load: {load_s:.1f}s  embedding: {1000 * embed_s / len(cosine):.1f} ms/doc")
+print(f"float parameter and buffer memory: {model_mb:.0f} MiB (int8 packed weights are not counted)")
@@ -0,0 +1,62 @@
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Anthropic messages endpoint, for exercising the LLM client
+# without an API key:
+#   python test/stub_llm_server.py --port 8765
+#   ANTHROPIC_API_KEY=stub ANTHROPIC_API_URL=http://localhost:8765/v1/messages streamlit run app.py
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed tokens (default: 0.05)")
+args = parser.parse_args()
+
+
+class MessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path != "/v1/messages":
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+        prompt = body["messages"][0]["content"]
+        words = f"Stub summary of a {len(prompt)} character prompt for {body['model']}.".split(" ")
+
+        if not body.get("stream"):
+            payload = json.dumps({
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": " ".join(words)}],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.send_event("message_start", {"type": "message_start", "message": {"role": "assistant"}})
+        self.send_event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+            time.sleep(args.delay)
+        self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self.send_event("message_stop", {"type": "message_stop"})
+        self.close_connection = True
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+print(f"Stub messages endpoint listening on http://localhost:{args.port}/v1/messages")
+ThreadingHTTPServer(("", args.port), MessagesHandler).serve_forever()
@@ -5,6 +5,7 @@ import xml.etree.ElementTree as ET
 import collections
 import streamlit as st
 import pandas as pd
+from test_queries import test_queries
 
 def get_count_of_words_in_engwebp_vpl_xml():
     tree = ET.parse("../data/engwebp_vpl.xml")
@@ -166,20 +167,6 @@ dbs = [
     for config in db_configs
 ]
 
-test_queries = {
-    "What did Jesus say about eternal life?": ["JHN 3", "JHN 17", "MAT 19"],
-    "What does the parable of the Prodigal Son reveal about forgiveness and family relationships?": ["LUK 15"],
-    "How is faith described in the New Testament?": ["HEB 11", "ROM 4", "JAS 2"],
-    "What are the Beatitudes and what do they teach about Christian life?": ["MAT 5"],
-    "What does Psalm 23 reflect about God's guidance and protection?": ["PSA 23"],
-    "How does the book of Revelation describe the end times?": ["REV 21", "REV 22", "REV 20"],
-    "What lessons can be learned from the story of David and Goliath?": ["1SA 17"],
-    "What does Paul say about love in his letters to the Corinthians?": ["1CO 13"],
-    "What teachings are given in the Sermon on the Mount?": ["MAT 5", "MAT 6", "MAT 7"],
-    "How does the book of Genesis describe the creation?": ["GEN 1", "GEN 2"]
-    # ... [add more test queries as needed]
-}
-
 
 results = query_databases(dbs, test_queries, 4, "cosine")
 # below has no effect on scoring
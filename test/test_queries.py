@@ -0,0 +1,14 @@
+# Gold set: query -> chapters ("BOOK CHAPTER") a good search should return
+test_queries = {
+    "What did Jesus say about eternal life?": ["JHN 3", "JHN 17", "MAT 19"],
+    "What does the parable of the Prodigal Son reveal about forgiveness and family relationships?": ["LUK 15"],
+    "How is faith described in the New Testament?": ["HEB 11", "ROM 4", "JAS 2"],
+    "What are the Beatitudes and what do they teach about Christian life?": ["MAT 5"],
+    "What does Psalm 23 reflect about God's guidance and protection?": ["PSA 23"],
+    "How does the book of Revelation describe the end times?": ["REV 21", "REV 22", "REV 20"],
+    "What lessons can be learned from the story of David and Goliath?": ["1SA 17"],
+    "What does Paul say about love in his letters to the Corinthians?": ["1CO 13"],
+    "What teachings are given in the Sermon on the Mount?": ["MAT 5", "MAT 6", "MAT 7"],
+    "How does the book of Genesis describe the creation?": ["GEN 1", "GEN 2"]
+    # ... [add more test queries as needed]
+}